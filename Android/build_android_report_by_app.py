@@ -9,8 +9,8 @@ RecentTasks + Snapshots(있으면) + UsageStats(RESUMED/PAUSED/STOPPED) 보고
 - 앱별 가장 최근 분 불일치: 최신 UsageStats 행과 최신 RecentTasks 행을 빨간색
 """
 import argparse, os, re, sqlite3
+from html import escape as _hesc
 from pathlib import Path
-from datetime import datetime, timezone, timedelta
 import pandas as pd
 
 SCRIPT_DIR = Path(__file__).resolve().parent
@@ -19,103 +19,142 @@ DEFAULT_DB_USG = SCRIPT_DIR / "data" / "usagestats_parsed.sqlite"
 DEFAULT_SNAP_DIR = SCRIPT_DIR / "data" / "snapshots"
 DEFAULT_HTML    = SCRIPT_DIR / "android_report_by_app.html"
 
+# real_activity → 패키지명 (우선순위: ComponentInfo{pkg/cls} → pkg/.Class, pkg Class → 순수 패키지 → 'pkg.' fallback)
+_RE_PACKAGE = re.compile(
+    r'^(?:.*?\{(?P<comp>[A-Za-z0-9._]+)/'
+    r'|(?P<slash>[A-Za-z0-9._]+)[/ ]'
+    r'|(?P<pure>[A-Za-z0-9._]+)$'
+    r'|.*?(?P<dot>[A-Za-z0-9._]+)\.)',
+    re.S,
+)
+_PACKAGE_GROUPS = ["comp", "slash", "pure", "dot"]
+
+# 스냅샷 이미지 확장자 (우선순위 순)
+SNAP_EXTS = (".jpg", ".png", ".webp", ".jpeg")
+_RE_SNAP_STEM = re.compile(r'(\d+)(_reduced)?')
+
+# 보고서 HTML 골격 (모듈 로드 시 한 번만 생성)
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="ko">
+<head>
+<meta charset="utf-8">
+<title>Android Forensic Report — Application별</title>
+<style>
+body {{font-family: -apple-system,BlinkMacSystemFont,"Segoe UI",sans-serif;margin:20px;}}
+h1 {{font-size:24px;margin-bottom:10px;}}
+h2 {{margin-top:40px;color:#0a58ca;}}
+.snapshots {{display:flex;flex-wrap:wrap;gap:12px;}}
+.snapshots figure {{text-align:center;width:240px;}}
+.snapshots img {{max-width:100%;border:1px solid #aaa;}}
+table {{font-size:12px;border-collapse:collapse;width:100%;}}
+th,td {{border:1px solid #999;padding:3px 6px;white-space:nowrap;}}
+th {{background:#f0f0f0;}}
+.blue td {{ color:#06c; font-weight:600; }}
+.red  td {{ color:#c00; font-weight:600; }}
+</style>
+</head>
+<body>
+<h1>📱 Android Forensic Report — Application별</h1>
+<p>기준 폴더: {base_dir}</p>
+"""
+_USG_TABLE_HEAD = "<table><thead><tr><th>last_time (KST)</th><th>types</th><th>class</th><th>source</th></tr></thead><tbody>"
+_RCT_TABLE_HEAD = "<table><thead><tr><th>last_time_moved (UTC)</th><th>task_id</th><th>real_activity</th><th>snapshot_file</th></tr></thead><tbody>"
+
 
 def _exists(p: Path) -> bool:
     return p.exists() and (p.is_file() or p.is_dir())
 
 
-def _extract_package(real_activity: str) -> str:
-    if not real_activity:
-        return None
-    s = str(real_activity).strip()
-    # ComponentInfo{pkg/cls}
-    m = re.search(r'\{([A-Za-z0-9._]+)/', s)
-    if m: return m.group(1)
-    # pkg/.Class  OR  pkg/Class
-    m = re.match(r'([A-Za-z0-9._]+)[/ ]', s)
-    if m: return m.group(1)
-    # pure package
-    m = re.match(r'^([A-Za-z0-9._]+)$', s)
-    if m: return m.group(1)
-    # fallback
-    m = re.search(r'([A-Za-z0-9._]+)\.', s)
-    return m.group(1) if m else None
-
-
 def read_recenttasks(db_path: Path) -> pd.DataFrame:
     if not _exists(db_path):
         print(f"[WARN] RecentTasks DB 없음: {db_path}")
-        return pd.DataFrame(columns=["task_id","real_activity","last_time_moved","last_time_moved_utc","snapshot_file","package"])
+        return pd.DataFrame(columns=["task_id","real_activity","last_time_moved","last_time_moved_utc","snapshot_file","package","_minute_kst"])
     con = sqlite3.connect(str(db_path))
     q = """
-    SELECT task_id, real_activity, last_time_moved, last_time_moved_utc, snapshot_file
+    SELECT task_id, real_activity, last_time_moved, last_time_moved_utc, snapshot_file,
+        CASE WHEN last_time_moved_utc IS NULL THEN ''
+             ELSE strftime('%Y-%m-%d %H:%M', CAST(last_time_moved AS INTEGER)/1000, 'unixepoch', '+9 hours')
+        END AS _minute_kst
     FROM recent_tasks
     ORDER BY CAST(last_time_moved AS INTEGER) DESC;
     """
     df = pd.read_sql_query(q, con)
     con.close()
-    df["package"] = df["real_activity"].apply(_extract_package)
+    # 같은 real_activity 가 반복되므로 고유값에 대해서만 패키지 추출 후 매핑
+    acts = df["real_activity"].fillna("").astype(str).str.strip()
+    uniq = pd.Series(acts.unique(), dtype=object)
+    ext = uniq.str.extract(_RE_PACKAGE)
+    df["package"] = acts.map(dict(zip(uniq, ext[_PACKAGE_GROUPS].bfill(axis=1).iloc[:, 0])))
     return df
 
 
 def read_usagestats(db_path: Path) -> pd.DataFrame:
     if not _exists(db_path):
         print(f"[WARN] UsageStats DB 없음: {db_path}")
-        return pd.DataFrame(columns=["last_time_kst","package","types","classs","source"])
+        return pd.DataFrame(columns=["last_time_kst","package","types","classs","source","_minute_kst"])
     con = sqlite3.connect(str(db_path))
+    try:
+        con.execute("CREATE INDEX IF NOT EXISTS idx_data_event ON data(usage_type, types, lastime DESC)")
+    except sqlite3.OperationalError as e:
+        print(f"[WARN] UsageStats 인덱스 생성 실패 (전체 스캔으로 진행): {e}")
     q = """
     SELECT
         datetime(lastime/1000,'unixepoch','+9 hours') AS last_time_kst,
         package, types, classs, source
     FROM data
     WHERE usage_type='event-log'
-      AND (
-        types='ACTIVITY_RESUMED' OR
-        types='ACTIVITY_PAUSED'  OR
-        types='ACTIVITY_PAUSE'   OR
-        types='ACTIVITY_STOPPED'
-      )
+      AND types IN ('ACTIVITY_RESUMED', 'ACTIVITY_PAUSED', 'ACTIVITY_PAUSE', 'ACTIVITY_STOPPED')
     ORDER BY lastime DESC;
     """
     df = pd.read_sql_query(q, con)
     con.close()
+    # 분(minute) 단위 키: 'YYYY-MM-DD HH:MM:SS' → 'YYYY-MM-DD HH:MM'
+    df["_minute_kst"] = df["last_time_kst"].fillna("").astype(str).str.replace("T", " ", regex=False).str.strip().str[:16]
     return df
 
 
 def index_snapshots(snap_dir: Path):
-    """재귀적으로 스냅샷 파일 인덱스 생성 (키: 파일명 소문자)"""
+    """
+    재귀적으로 스냅샷 파일 인덱스 생성
+    - mapping  : 파일명 소문자 → 파일 경로
+    - by_digits: task_id 숫자 → 파일 경로 목록 ({id}.jpg/.png/.webp/.jpeg, {id}_reduced.* 순)
+    """
     mapping = {}
+    by_digits = {}
     if not _exists(snap_dir):
-        return mapping
-    for p in snap_dir.rglob("*"):
-        if p.is_file():
-            mapping[p.name.lower()] = p
-    return mapping
+        return mapping, by_digits
+    for dirpath, _, filenames in os.walk(snap_dir):
+        for fn in filenames:
+            mapping[fn.lower()] = os.path.join(dirpath, fn)
+
+    ranked = {}
+    for key, p in mapping.items():
+        stem, ext = os.path.splitext(key)
+        if ext not in SNAP_EXTS:
+            continue
+        m = _RE_SNAP_STEM.fullmatch(stem)
+        if m:
+            ranked.setdefault(m.group(1), []).append(((bool(m.group(2)), SNAP_EXTS.index(ext)), p))
+    for digits, items in ranked.items():
+        by_digits[digits] = [p for _, p in sorted(items, key=lambda x: x[0])]
+    return mapping, by_digits
 
 
-def _minute_key_from_usg(s: str) -> str:
-    """UsageStats 'YYYY-MM-DD HH:MM:SS' -> 'YYYY-MM-DD HH:MM'"""
-    if not s:
-        return ""
-    s = str(s).replace("T", " ").strip()
-    return s[:16]
+def esc_series(s: pd.Series) -> pd.Series:
+    """Series 단위 HTML escape (결측값 → 빈 문자열)"""
+    return (s.astype(str).where(s.notna(), "")
+             .str.replace("&", "&amp;", regex=False)
+             .str.replace("<", "&lt;", regex=False)
+             .str.replace(">", "&gt;", regex=False))
 
 
-def _minute_key_from_rct_utc_to_kst(s: str) -> str:
-    """RecentTasks UTC 문자열을 KST로 변환 후 'YYYY-MM-DD HH:MM' 반환"""
-    if not s:
-        return ""
-    try:
-        try:
-            dt = datetime.fromisoformat(str(s))
-        except Exception:
-            dt = datetime.fromisoformat(str(s).replace(" ", "T"))
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        kst = dt.astimezone(timezone(timedelta(hours=9)))
-        return kst.strftime("%Y-%m-%d %H:%M")
-    except Exception:
-        return str(s).replace("T"," ")[:16]
+def _row_classes(mk: pd.Series, intersect_minutes, own_recent: str, other_recent: str) -> pd.Series:
+    """분 키 Series → 행 class 속성 (일치=파랑, 최신 불일치=빨강)"""
+    cls = pd.Series("", index=mk.index, dtype=object)
+    if own_recent and other_recent and own_recent != other_recent:
+        cls[mk == own_recent] = " class='red'"
+    cls[mk.isin(intersect_minutes)] = " class='blue'"
+    return cls
 
 
 def build_html(df_rct, df_usg, snap_dir: Path, out_path: Path):
@@ -131,169 +170,93 @@ def build_html(df_rct, df_usg, snap_dir: Path, out_path: Path):
     df_usg2["pkg2"] = df_usg2["package"].fillna("android").astype(str)
 
     # 스냅샷 인덱스
-    snap_index = index_snapshots(snap_dir)
-
-    # 스냅샷 보유 점수 계산
-    def _snapshot_score_for_pkg(pkg: str) -> int:
-        sub_r = df_rct2[df_rct2["pkg2"] == pkg]
-        if sub_r.empty:
-            return 0
-        exts = [".jpg",".png",".webp",".jpeg"]
-        score = 0
-        for _, r in sub_r.iterrows():
-            sf = str(r.get("snapshot_file","") or "").strip().lower()
-            if sf and sf in snap_index:
-                score += 1
-                continue
-            tid = str(r.get("task_id","") or "")
-            digits = "".join(ch for ch in tid if ch.isdigit())
-            candidates = []
-            if sf:
-                candidates.append(sf)
-            if digits:
-                candidates += [f"{digits}{e}" for e in exts] + [f"{digits}_reduced{e}" for e in exts]
-            found = False
-            for cand in candidates:
-                if cand in snap_index:
-                    found = True
-                    break
-                for key in snap_index.keys():
-                    if key.endswith(cand):
-                        found = True
-                        break
-                if found:
-                    break
-            if found:
-                score += 1
-        return score
+    snap_index, by_digits = index_snapshots(snap_dir)
+
+    # 행별 스냅샷 경로를 한 번만 결정 (정렬 점수와 이미지 출력에 공통 사용)
+    # snapshot_file 은 파일명(basename)으로 정규화해 인덱스 키와 바로 비교, 없으면 task_id 숫자로 탐색
+    sf_l = (df_rct2["snapshot_file"].fillna("").astype(str).str.strip().str.lower()
+            .str.replace("\\", "/", regex=False).str.rsplit("/", n=1).str[-1])
+    digits = df_rct2["task_id"].fillna("").astype(str).str.replace(r"\D", "", regex=True)
+    by_id = digits.map({d: paths[0] for d, paths in by_digits.items()})
+    df_rct2["_snap_path"] = sf_l.map(snap_index).fillna(by_id)
+
+    # 스냅샷 보유 점수 (앱별 스냅샷이 매칭되는 RecentTasks 행 수)
+    scores = df_rct2["_snap_path"].notna().groupby(df_rct2["pkg2"]).sum().to_dict()
+
+    groups_r = {k: v for k, v in df_rct2.groupby("pkg2", sort=False)}
+    groups_u = {k: v for k, v in df_usg2.groupby("pkg2", sort=False)}
 
     # 정렬용 앱 목록
-    pkgs_all = sorted(set(df_rct2["pkg2"].unique()).union(set(df_usg2["pkg2"].unique())))
-    pkgs = sorted(pkgs_all, key=lambda x: (-_snapshot_score_for_pkg(x), x or ""))
+    pkgs_all = sorted(set(groups_r) | set(groups_u))
+    pkgs = sorted(pkgs_all, key=lambda x: (-scores.get(x, 0), x or ""))
 
     def esc(s):
-        return (str(s).replace("&","&amp;").replace("<","&lt;").replace(">","&gt;") if s is not None else "")
-
-    html = [f"""<!DOCTYPE html>
-<html lang="ko">
-<head>
-<meta charset="utf-8">
-<title>Android Forensic Report — Application별</title>
-<style>
-body {{font-family: -apple-system,BlinkMacSystemFont,"Segoe UI",sans-serif;margin:20px;}}
-h1 {{font-size:24px;margin-bottom:10px;}}
-h2 {{margin-top:40px;color:#0a58ca;}}
-.snapshots {{display:flex;flex-wrap:wrap;gap:12px;}}
-.snapshots figure {{text-align:center;width:240px;}}
-.snapshots img {{max-width:100%;border:1px solid #aaa;}}
-table {{font-size:12px;border-collapse:collapse;width:100%;}}
-th,td {{border:1px solid #999;padding:3px 6px;white-space:nowrap;}}
-th {{background:#f0f0f0;}}
-.blue td {{ color:#06c; font-weight:600; }}
-.red  td {{ color:#c00; font-weight:600; }}
-</style>
-</head>
-<body>
-<h1>📱 Android Forensic Report — Application별</h1>
-<p>기준 폴더: {esc(str(out_path.parent))}</p>
-"""]
-
-    exts = [".jpg",".png",".webp",".jpeg"]
-    for pkg in pkgs:
-        html.append(f'<h2 id="{pkg}">{pkg}</h2>')
-
-        # 앱별 서브셋 준비
-        sub_r = df_rct2[df_rct2["pkg2"] == pkg]
-        sub_u = df_usg2[df_usg2["pkg2"] == pkg]
-
-        # 분 단위 키 세트
-        usg_minutes = [(_minute_key_from_usg(x), i) for i, x in enumerate(sub_u["last_time_kst"].dropna().astype(str).tolist())]
-        rct_minutes = [(_minute_key_from_rct_utc_to_kst(x), i) for i, x in enumerate(sub_r["last_time_moved_utc"].dropna().astype(str).tolist())]
-        usg_min_set = set(m for m, _ in usg_minutes if m)
-        rct_min_set = set(m for m, _ in rct_minutes if m)
-        intersect_minutes = usg_min_set & rct_min_set
-        most_recent_usg_min = max(usg_min_set) if usg_min_set else ""
-        most_recent_rct_min = max(rct_min_set) if rct_min_set else ""
-
-        # --- UsageStats subset ---
-        if not sub_u.empty:
-            html.append("<h3>UsageStats — ACTIVITY_RESUMED / PAUSED / STOPPED</h3>")
-            html.append("<table><thead><tr><th>last_time (KST)</th><th>types</th><th>class</th><th>source</th></tr></thead><tbody>")
-            for _, r in sub_u.sort_values(by="last_time_kst", ascending=False).iterrows():
-                mk = _minute_key_from_usg(r.get('last_time_kst'))
-                row_cls = ""
-                if mk:
-                    if mk in intersect_minutes:
-                        row_cls = " class='blue'"
-                    elif most_recent_usg_min and most_recent_rct_min and (mk == most_recent_usg_min) and (most_recent_usg_min != most_recent_rct_min):
-                        row_cls = " class='red'"
-                html.append(f"<tr{row_cls}>"
-                            f"<td>{esc(r.get('last_time_kst'))}</td>"
-                            f"<td>{esc(r.get('types'))}</td>"
-                            f"<td>{esc(r.get('classs'))}</td>"
-                            f"<td>{esc(r.get('source'))}</td>"
-                            "</tr>")
-            html.append("</tbody></table>")
-
-        # --- RecentTasks ---
-        if sub_r.empty and sub_u.empty:
-            html.append("<p><i>해당 앱에 대한 RecentTasks/UsageStats 데이터가 없습니다.</i></p>")
-            continue
+        return _hesc("" if s is None else str(s), quote=False)
+
+    # 보고서 전체를 메모리에 모으지 않고 파일로 바로 기록
+    with out_path.open("w", encoding="utf-8", buffering=1 << 20) as f:
+        f.write(_HTML_HEAD.format(base_dir=esc(str(out_path.parent))))
+
+        for pkg in pkgs:
+            print(f'<h2 id="{pkg}">{pkg}</h2>', file=f)
+
+            # 앱별 서브셋 준비
+            sub_r = groups_r.get(pkg, df_rct2.iloc[0:0])
+            sub_u = groups_u.get(pkg, df_usg2.iloc[0:0])
+
+            # 분 단위 키 세트
+            usg_min_set = set(sub_u["_minute_kst"]) - {""}
+            rct_min_set = set(sub_r["_minute_kst"]) - {""}
+            intersect_minutes = usg_min_set & rct_min_set
+            most_recent_usg_min = max(usg_min_set) if usg_min_set else ""
+            most_recent_rct_min = max(rct_min_set) if rct_min_set else ""
+
+            # --- UsageStats subset ---
+            if not sub_u.empty:
+                print("<h3>UsageStats — ACTIVITY_RESUMED / PAUSED / STOPPED</h3>", file=f)
+                print(_USG_TABLE_HEAD, file=f)
+                su = sub_u.sort_values(by="last_time_kst", ascending=False)
+                cls = _row_classes(su["_minute_kst"], intersect_minutes, most_recent_usg_min, most_recent_rct_min)
+                rows = ("<tr" + cls + ">"
+                        + "<td>" + esc_series(su["last_time_kst"]) + "</td>"
+                        + "<td>" + esc_series(su["types"]) + "</td>"
+                        + "<td>" + esc_series(su["classs"]) + "</td>"
+                        + "<td>" + esc_series(su["source"]) + "</td>"
+                        + "</tr>")
+                print(rows.str.cat(sep="\n"), file=f)
+                print("</tbody></table>", file=f)
+
+            # --- RecentTasks ---
+            if sub_r.empty and sub_u.empty:
+                print("<p><i>해당 앱에 대한 RecentTasks/UsageStats 데이터가 없습니다.</i></p>", file=f)
+                continue
 
-        if not sub_r.empty:
-            html.append("<h3>RecentTasks (with Snapshot)</h3>")
-            html.append("<table><thead><tr><th>last_time_moved (UTC)</th><th>task_id</th><th>real_activity</th><th>snapshot_file</th></tr></thead><tbody>")
-            for _, r in sub_r.iterrows():
-                mk = _minute_key_from_rct_utc_to_kst(r.get('last_time_moved_utc'))
-                row_cls = ""
-                if mk:
-                    if mk in intersect_minutes:
-                        row_cls = " class='blue'"
-                    elif most_recent_usg_min and most_recent_rct_min and (mk == most_recent_rct_min) and (most_recent_usg_min != most_recent_rct_min):
-                        row_cls = " class='red'"
-                html.append(f"<tr{row_cls}>"
-                            f"<td>{esc(r.get('last_time_moved_utc'))}</td>"
-                            f"<td>{esc(r.get('task_id'))}</td>"
-                            f"<td>{esc(r.get('real_activity'))}</td>"
-                            f"<td>{esc(r.get('snapshot_file'))}</td>"
-                            "</tr>")
-            html.append("</tbody></table>")
-
-            # 스냅샷 탐색
-            imgs = []
-            for _, r in sub_r.iterrows():
-                name = str(r.get("snapshot_file","")).strip()
-                tid  = str(r.get("task_id","")).strip()
-                digits = "".join(ch for ch in tid if ch.isdigit())
-
-                candidates = []
-                if name: candidates.append(name)
-                if digits: candidates += [f"{digits}{e}" for e in exts] + [f"{digits}_reduced{e}" for e in exts]
-
-                found = None
-                for cand in candidates:
-                    lc = cand.lower()
-                    if lc in snap_index:
-                        found = snap_index[lc]
-                        break
-                    # endswith 매칭 허용
-                    for key,path in snap_index.items():
-                        if key.endswith(lc):
-                            found = path
-                            break
-                    if found: break
-                if found:
-                    rel = os.path.relpath(found, start=out_path.parent).replace("\\","/")
-                    imgs.append((rel, found.name))
-
-            if imgs:
-                html.append("<h3>Snapshot Images</h3><div class='snapshots'>")
-                for rel, name in sorted(set(imgs)):
-                    html.append(f"<figure><img src='{rel}' width='240'><figcaption>{esc(name)}</figcaption></figure>")
-                html.append("</div>")
-
-    html.append("</body></html>")
-    out_path.write_text("\n".join(html), encoding="utf-8")
+            if not sub_r.empty:
+                print("<h3>RecentTasks (with Snapshot)</h3>", file=f)
+                print(_RCT_TABLE_HEAD, file=f)
+                cls = _row_classes(sub_r["_minute_kst"], intersect_minutes, most_recent_rct_min, most_recent_usg_min)
+                rows = ("<tr" + cls + ">"
+                        + "<td>" + esc_series(sub_r["last_time_moved_utc"]) + "</td>"
+                        + "<td>" + esc_series(sub_r["task_id"]) + "</td>"
+                        + "<td>" + esc_series(sub_r["real_activity"]) + "</td>"
+                        + "<td>" + esc_series(sub_r["snapshot_file"]) + "</td>"
+                        + "</tr>")
+                print(rows.str.cat(sep="\n"), file=f)
+                print("</tbody></table>", file=f)
+
+                # 스냅샷 탐색
+                imgs = sorted({
+                    (os.path.relpath(found, start=out_path.parent).replace("\\", "/"), os.path.basename(found))
+                    for found in sub_r["_snap_path"].dropna().unique()
+                })
+
+                if imgs:
+                    print("<h3>Snapshot Images</h3><div class='snapshots'>", file=f)
+                    for rel, name in imgs:
+                        print(f"<figure><img src='{rel}' width='240'><figcaption>{esc(name)}</figcaption></figure>", file=f)
+                    print("</div>", file=f)
+
+        print("</body></html>", file=f)
     print(f"[OK] 보고서 생성 완료 → {out_path}")
 
 
@@ -13,20 +13,34 @@ ABX(Binary XML) 지원 (ALEAPP의 scripts\ilapfuncs.py 필요)
 """
 
 import os
-import glob
 import argparse
 import sqlite3
 import xml.etree.ElementTree as ET
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 
-# ABX 파서 (ALEAPP의 scripts\ilapfuncs.py)
-try:
-    from scripts.ilapfuncs import abxread, checkabx
-    print("[INFO] ALEAPP ilapfuncs 로딩 성공 (ABX 지원 활성화)")
-except ImportError as e:
-    abxread = None
-    checkabx = None
-    print(f"[WARN] ALEAPP ilapfuncs 로딩 실패, ABX(Binary XML)는 일반 XML처럼 처리됩니다. ({e})")
+# ABX 파서 (ALEAPP의 scripts\ilapfuncs.py) — _load_abx() 로 필요할 때 로드
+abxread = None
+checkabx = None
+
+
+def _load_abx(announce=True):
+    """
+    ALEAPP ilapfuncs 를 import 해서 abxread/checkabx 설정.
+    모듈 import 시점이 아니라 메인 프로세스/워커 initializer 에서 호출하므로
+    spawn 워커가 ilapfuncs 를 중복 로딩하거나 INFO/WARN 을 반복 출력하지 않음.
+    """
+    global abxread, checkabx
+    try:
+        from scripts.ilapfuncs import abxread, checkabx
+        if announce:
+            print("[INFO] ALEAPP ilapfuncs 로딩 성공 (ABX 지원 활성화)")
+    except ImportError as e:
+        abxread = None
+        checkabx = None
+        if announce:
+            print(f"[WARN] ALEAPP ilapfuncs 로딩 실패, ABX(Binary XML)는 일반 XML처럼 처리됩니다. ({e})")
 
 
 def ms_to_iso(ms):
@@ -42,6 +56,9 @@ def init_db(db_path):
     if os.path.exists(db_path):
         os.remove(db_path)
     conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
     cur = conn.cursor()
     cur.execute("""
         CREATE TABLE IF NOT EXISTS recent_tasks (
@@ -56,43 +73,53 @@ def init_db(db_path):
     return conn
 
 
-def insert_row(conn, task_id, real_activity, last_time_moved, iso_time, snapshot_file):
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO recent_tasks
-            (task_id, real_activity, last_time_moved, last_time_moved_utc, snapshot_file)
-        VALUES (?, ?, ?, ?, ?)
-    """, (task_id, real_activity, last_time_moved, iso_time, snapshot_file))
-    conn.commit()
-
-
-def find_snapshot_for_task(snapshots_dir, task_id):
-    """snapshots 폴더에서 task_id.* 파일 찾기 (jpg, png 등)"""
+def index_snapshots(snapshots_dir):
+    """
+    snapshots 폴더를 한 번만 스캔해서 task_id → 파일명 인덱스 생성
+      - by_stem  : '{task_id}.*'   에 매칭되는 파일명 목록
+      - by_prefix: '{task_id}_*.*' 에 매칭되는 파일명 목록
+    """
+    by_stem = defaultdict(list)
+    by_prefix = defaultdict(list)
+    if not os.path.isdir(snapshots_dir):
+        return by_stem, by_prefix
+    with os.scandir(snapshots_dir) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            name = entry.name
+            for i, ch in enumerate(name):
+                if ch == ".":
+                    by_stem[name[:i]].append(name)
+                elif ch == "_" and "." in name[i + 1:]:
+                    by_prefix[name[:i]].append(name)
+    return by_stem, by_prefix
+
+
+def find_snapshot_for_task(snap_idx, task_id):
+    """snapshots 인덱스에서 task_id.* / task_id_*.* 파일 찾기 (jpg, png 등)"""
     if not task_id:
         return None
-    patterns = [
-        os.path.join(snapshots_dir, f"{task_id}.*"),
-        os.path.join(snapshots_dir, f"{task_id}_*.*"),
-    ]
-    for pattern in patterns:
-        files = glob.glob(pattern)
+    for idx in snap_idx:
+        files = idx.get(task_id)
         if files:
-            return os.path.basename(files[0])
+            return files[0]
     return None
 
 
-def parse_recent_task(file_path, snapshots_dir):
+def parse_recent_task(file_path, snap_idx):
     """
     XML 또는 ABX recent_task 파일에서
     (task_id, real_activity, last_time_moved, last_time_moved_utc, snapshot_file) 추출
     """
     try:
         if checkabx and checkabx(file_path):
-            tree = abxread(file_path, False)
+            root = abxread(file_path, False).getroot()
         else:
-            tree = ET.parse(file_path)
+            # 루트 속성만 필요하므로 첫 start 이벤트에서 멈춤 (하위 노드는 만들지 않음)
+            with open(file_path, "rb") as fh:
+                _, root = next(ET.iterparse(fh, events=("start",)))
 
-        root = tree.getroot()
         attrs = root.attrib
 
         task_id = os.path.splitext(os.path.basename(file_path))[0]
@@ -100,7 +127,7 @@ def parse_recent_task(file_path, snapshots_dir):
         last_time_moved = attrs.get("last_time_moved", "0")
         iso_time = ms_to_iso(last_time_moved)
 
-        snapshot_file = find_snapshot_for_task(snapshots_dir, task_id)
+        snapshot_file = find_snapshot_for_task(snap_idx, task_id)
 
         return task_id, real_activity, last_time_moved, iso_time, snapshot_file
     except Exception as e:
@@ -108,6 +135,20 @@ def parse_recent_task(file_path, snapshots_dir):
         return None
 
 
+# 워커 프로세스별 스냅샷 인덱스 (initializer 로 한 번만 전달)
+_SNAP_IDX = None
+
+
+def _init_worker(snap_idx):
+    global _SNAP_IDX
+    _SNAP_IDX = snap_idx
+    _load_abx(announce=False)
+
+
+def _parse_in_worker(file_path):
+    return parse_recent_task(file_path, _SNAP_IDX)
+
+
 def build_html(db_path, snapshots_dir_name, html_path):
     """SQLite 내용 + snapshots 를 이용해 HTML 리포트 생성"""
     conn = sqlite3.connect(db_path)
@@ -191,17 +232,29 @@ def process_recent_tasks(root_dir, db_path, html_path):
     else:
         snapshots_dir_name = os.path.basename(snapshots_dir)
 
-    conn = init_db(db_path)
-    count = 0
+    _load_abx()
+    snap_idx = index_snapshots(snapshots_dir)
 
-    for file in glob.glob(os.path.join(recent_dir, "**"), recursive=True):
-        if os.path.isfile(file):
-            parsed = parse_recent_task(file, snapshots_dir)
-            if parsed:
-                insert_row(conn, *parsed)
-                count += 1
+    # glob('**') 와 동일하게 숨김(.xxx) 파일/폴더는 제외
+    files = []
+    for dirpath, dirnames, filenames in os.walk(recent_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        files.extend(os.path.join(dirpath, fn) for fn in filenames if not fn.startswith("."))
 
+    # 파일별 파싱은 서로 독립적이므로 CPU 코어 수만큼 병렬 처리
+    with ProcessPoolExecutor(initializer=_init_worker, initargs=(snap_idx,)) as ex:
+        rows = [r for r in ex.map(_parse_in_worker, files, chunksize=64) if r]
+
+    # 전체 행을 하나의 트랜잭션으로 일괄 저장
+    conn = init_db(db_path)
+    with conn:
+        conn.executemany("""
+            INSERT INTO recent_tasks
+                (task_id, real_activity, last_time_moved, last_time_moved_utc, snapshot_file)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
     conn.close()
+    count = len(rows)
     print(f"[OK] {count}개 recent_task 항목이 SQLite에 저장되었습니다 → {db_path}")
 
     build_html(db_path, snapshots_dir_name, html_path)
@@ -6,12 +6,29 @@
 
 import os
 import sys
-import glob
 import json
+import argparse
+import mmap
 import sqlite3
-import xml.etree.ElementTree as ET
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from enum import IntEnum
 
+try:
+    from lxml import etree as ET  # C 파서 (설치되어 있으면 사용)
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+try:
+    import orjson  # C 구현 JSON (설치되어 있으면 사용)
+
+    def _attrib_json(att: dict) -> str:
+        return orjson.dumps(att).decode()
+except ImportError:
+    def _attrib_json(att: dict) -> str:
+        # orjson과 같은 출력(공백 없음, 비ASCII 그대로)
+        return json.dumps(att, ensure_ascii=False, separators=(",", ":"))
+
 # -----------------------------
 # 경로/패키지 설정 (import 문제 방지)
 # -----------------------------
@@ -34,26 +51,31 @@ if "protobuf" not in sys.modules:
     pkg.__path__ = [PROTO_DIR]  # 패키지 경로로 인식
     sys.modules["protobuf"] = pkg
 
+# spawn 워커에서 다시 import될 때는 아래 로드 경고를 반복 출력하지 않음
+_IN_WORKER = multiprocessing.current_process().name != "MainProcess"
+
 # google.protobuf 런타임 존재 확인
 _HAVE_GOOGLE = True
 try:
     import google.protobuf  # noqa: F401
 except Exception as _e:
     _HAVE_GOOGLE = False
-    print("[WARN] google.protobuf 런타임이 없어 v2 파싱은 건너뜁니다. (XML/v1은 계속 처리)")
+    if not _IN_WORKER:
+        print("[WARN] google.protobuf 런타임이 없어 v2 파싱은 건너뜁니다. (XML/v1은 계속 처리)")
 
 # pb2 모듈 로드 (런타임 없으면 실패 → None)
 try:
     import protobuf.usagestatsservice_pb2 as usagestatsservice_pb2  # v1
 except Exception as e:
     usagestatsservice_pb2 = None
-    print("[WARN] usagestatsservice_pb2 로드 실패:", e)
+    if not _IN_WORKER:
+        print("[WARN] usagestatsservice_pb2 로드 실패:", e)
 
 try:
     import protobuf.usagestatsservice_v2_pb2 as usagestatsservice_v2_pb2  # v2
 except Exception as e:
     usagestatsservice_v2_pb2 = None
-    if _HAVE_GOOGLE:
+    if _HAVE_GOOGLE and not _IN_WORKER:
         print("[WARN] usagestatsservice_v2_pb2 로드 실패:", e)
     else:
         # 위에서 이미 런타임 경고 출력했으니 추가 메시지는 생략 가능
@@ -100,6 +122,10 @@ class EventType(IntEnum):
         return self.name
 
 
+# 이벤트 타입 값 → 이름 (행마다 Enum 생성/ max() 계산하지 않도록 미리 계산)
+_ETYPE_NAMES = {m.value: m.name for m in EventType}
+
+
 def _get_string_by_token(packages_map, token1, token2=0):
     """v2: package_token / class_token -> 문자열"""
     strings = packages_map.get(token1)
@@ -112,14 +138,69 @@ def _get_string_by_token(packages_map, token1, token2=0):
     return ""
 
 
+# 파일 단위 진행 로그 출력 여부 (-v/--verbose). 경고는 항상 출력
+VERBOSE = False
+
+
+def log(*args):
+    if VERBOSE:
+        print(*args)
+
+
+def _init_worker(verbose: bool):
+    """spawn 워커는 모듈을 새로 import 하므로 VERBOSE 를 다시 설정"""
+    global VERBOSE
+    VERBOSE = verbose
+
+
+INTERVALS = frozenset(("daily", "weekly", "monthly", "yearly"))
+
+
+def _iter_files(root_dir: str):
+    """root_dir 아래 일반 파일 (DirEntry, source) 순회
+    - scandir 스택, 숨김 항목 제외 (= glob '**'와 동일)
+    - source: 파일이 속한 interval 폴더 이름(daily/weekly/monthly/yearly), 없으면 ""
+    """
+    stack = [(root_dir, "")]
+    while stack:
+        d, src = stack.pop()
+        with os.scandir(d) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, name if name in INTERVALS else src))
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry, src
+
+
 # -----------------------------
 # DB
 # -----------------------------
+INSERT_SQL = (
+    "INSERT INTO data"
+    " (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,"
+    " total_time_visible,app_launch_count,package,types,classs,source,fullatt)"
+    " VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"
+)
+
+
 def init_db(path: str) -> sqlite3.Connection:
     os.makedirs(os.path.dirname(path), exist_ok=True)
     if os.path.exists(path):
         os.remove(path)
-    db = sqlite3.connect(path)
+    # 매번 새로 만드는 일회성 DB → 저널/fsync 없이 벌크 적재
+    # isolation_level=None: 트랜잭션(BEGIN/COMMIT)은 직접 관리
+    db = sqlite3.connect(path, isolation_level=None)
+    for pragma in (
+        "PRAGMA journal_mode=OFF",
+        "PRAGMA synchronous=OFF",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA locking_mode=EXCLUSIVE",
+    ):
+        db.execute(pragma)
     cur = db.cursor()
     cur.execute(
         """
@@ -139,35 +220,48 @@ def init_db(path: str) -> sqlite3.Connection:
         )
         """
     )
-    db.commit()
     return db
 
 
 # -----------------------------
 # v1(XML/protobuf) 파싱
 # -----------------------------
+def _parse_pb_file(msg, path: str):
+    """파일을 mmap으로 매핑해 바로 파싱 (f.read() 전체 복사 생략)"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            msg.ParseFromString(b"")  # 빈 파일은 mmap 불가
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            msg.ParseFromString(mm)
+
+
+# 파일마다 메시지를 새로 만들지 않고 프로세스당 하나를 재사용
+# (ParseFromString 이 기존 내용을 Clear 하므로 호출자는 다음 파일 전에 바로 소비해야 함)
+_V1_MSG = usagestatsservice_pb2.IntervalStatsProto() if usagestatsservice_pb2 is not None else None
+
+
 def _read_pb_v1(path: str):
-    if usagestatsservice_pb2 is None:
+    if _V1_MSG is None:
         raise RuntimeError("v1 protobuf 모듈(usagestatsservice_pb2)을 로드하지 못했습니다.")
-    msg = usagestatsservice_pb2.IntervalStatsProto()
-    with open(path, "rb") as f:
-        msg.ParseFromString(f.read())
-    return msg
+    _parse_pb_file(_V1_MSG, path)
+    return _V1_MSG
 
 
-def _add_v1_to_db(sourced: str, base_epoch: int, stats, db: sqlite3.Connection):
-    cur = db.cursor()
+def _v1_to_rows(sourced: str, base_epoch: int, stats) -> list:
+    rows = []
     pool = list(getattr(stats, "stringpool").strings)
 
     # packages
     for rec in stats.packages:
+        has = rec.HasField  # 바운드 메서드 1회만 조회
         finalt = ""
-        if rec.HasField("last_time_active_ms"):
+        if has("last_time_active_ms"):
             t = rec.last_time_active_ms
             finalt = abs(t) if t < 0 else t + base_epoch
 
         tac = ""
-        if rec.HasField("total_time_active_ms"):
+        if has("total_time_active_ms"):
             tac = abs(rec.total_time_active_ms)
 
         pkg = ""
@@ -176,319 +270,251 @@ def _add_v1_to_db(sourced: str, base_epoch: int, stats, db: sqlite3.Connection):
             pkg = pool[idx - 1]
 
         alc = ""
-        if rec.HasField("app_launch_count"):
+        if has("app_launch_count"):
             alc = abs(rec.app_launch_count)
 
-        cur.execute(
-            """
-            INSERT INTO data
-            (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,
-             total_time_visible,app_launch_count,package,types,classs,source,fullatt)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-            """,
-            ("packages", finalt, tac, "", "", "", alc, pkg, "", "", sourced, ""),
-        )
+        rows.append(("packages", finalt, tac, "", "", "", alc, pkg, "", "", sourced, ""))
 
     # configurations
     for conf in stats.configurations:
+        has = conf.HasField
         finalt = ""
-        if conf.HasField("last_time_active_ms"):
+        if has("last_time_active_ms"):
             t = conf.last_time_active_ms
             finalt = abs(t) if t < 0 else t + base_epoch
 
         tac = ""
-        if conf.HasField("total_time_active_ms"):
+        if has("total_time_active_ms"):
             tac = abs(conf.total_time_active_ms)
 
-        cur.execute(
-            """
-            INSERT INTO data
-            (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,
-             total_time_visible,app_launch_count,package,types,classs,source,fullatt)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-            """,
-            ("configurations", finalt, tac, "", "", "", "", "", "", "", sourced, str(conf.config)),
-        )
+        rows.append(("configurations", finalt, tac, "", "", "", "", "", "", "", sourced, str(conf.config)))
 
     # event-log
     for ev in stats.event_log:
+        has = ev.HasField
         finalt = ""
-        if ev.HasField("time_ms"):
+        if has("time_ms"):
             t = ev.time_ms
             finalt = abs(t) if t < 0 else t + base_epoch
 
         pkg = ""
         classy = ""
-        if ev.HasField("package_index"):
+        if has("package_index"):
             idx = ev.package_index
             if 0 < idx <= len(pool):
                 pkg = pool[idx - 1]
-        if ev.HasField("class_index"):
+        if has("class_index"):
             idx = ev.class_index
             if 0 < idx <= len(pool):
                 classy = pool[idx - 1]
 
         tipes = ""
-        if ev.HasField("type"):
-            tipes = str(EventType(ev.type)) if ev.type <= max(EventType).value else str(ev.type)
-
-        cur.execute(
-            """
-            INSERT INTO data
-            (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,
-             total_time_visible,app_launch_count,package,types,classs,source,fullatt)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-            """,
-            ("event-log", finalt, "", "", "", "", "", pkg, tipes, classy, sourced, ""),
-        )
+        if has("type"):
+            tipes = _ETYPE_NAMES.get(ev.type) or str(ev.type)
+
+        rows.append(("event-log", finalt, "", "", "", "", "", pkg, tipes, classy, sourced, ""))
+
+    return rows
+
+
+def _is_xml(fp: str) -> bool:
+    """앞 16바이트만 보고 XML 여부 판별 (BOM/공백 허용)"""
+    with open(fp, "rb") as f:
+        head = f.read(16)
+    # BOM 은 3바이트 전체가 접두사일 때만 제거 (0xEF/0xBB/0xBF 로 시작하는 protobuf 오판 방지)
+    if head.startswith(b"\xef\xbb\xbf"):
+        head = head[3:]
+    return head.lstrip().startswith(b"<")
+
+
+def _xml_to_rows(fp: str, src: str, base_epoch: int) -> list:
+    """XML 한 파일 → data 행 목록 (iterparse 단일 패스, 섹션 처리 후 메모리 해제)"""
+    rows = []
+    for _, elem in ET.iterparse(fp, events=("end",)):
+        tag = elem.tag
+
+        if tag == "packages":
+            for sub in elem:
+                att = sub.attrib
+                fullatt = _attrib_json(dict(att))
+                t = int(att["lastTimeActive"])
+                finalt = abs(t) if t < 0 else int(base_epoch + t)
+                pkg = att.get("package", "")
+                tac = att.get("timeActive", "")
+                alc = att.get("appLaunchCount", "")
+                rows.append((tag, finalt, tac, "", "", "", alc, pkg, "", "", src, fullatt))
+
+        elif tag == "configurations":
+            for sub in elem:
+                att = sub.attrib
+                fullatt = _attrib_json(dict(att))
+                t = int(att["lastTimeActive"])
+                finalt = abs(t) if t < 0 else int(base_epoch + t)
+                tac = att.get("timeActive", "")
+                rows.append((tag, finalt, tac, "", "", "", "", "", "", "", src, fullatt))
+
+        elif tag == "event-log":
+            for sub in elem:
+                att = sub.attrib
+                t = int(att["time"])
+                finalt = abs(t) if t < 0 else int(base_epoch + t)
+                pkg = att.get("package", "")
+                tipes = att.get("type", "")
+                classy = att.get("class", "")
+                fullatt = _attrib_json(dict(att))
+                rows.append((tag, finalt, "", "", "", "", "", pkg, tipes, classy, src, fullatt))
 
-    db.commit()
+        else:
+            continue
 
+        elem.clear()
+    return rows
 
-def _parse_xml_or_v1_dir(root_dir: str, db: sqlite3.Connection):
-    for fp in glob.iglob(os.path.join(root_dir, "**"), recursive=True):
-        if not os.path.isfile(fp):
-            continue
 
-        name = os.path.basename(fp)
+def _parse_xml_or_v1_dir(root_dir: str) -> list:
+    out = []
+    for entry, src in _iter_files(root_dir):
+        fp, name = entry.path, entry.name
         if name == "version":
             continue
 
-        # source 구분
-        if "daily" in fp:
-            src = "daily"
-        elif "weekly" in fp:
-            src = "weekly"
-        elif "monthly" in fp:
-            src = "monthly"
-        elif "yearly" in fp:
-            src = "yearly"
-        else:
-            src = ""
-
         try:
             base_epoch = int(name)
         except Exception:
             print("[WARN] 파일명이 타임스탬프 형식이 아님:", fp)
             continue
 
-        # XML 여부 판별
-        try:
-            ET.parse(fp)
-            is_xml = True
-        except ET.ParseError:
-            is_xml = False
+        # XML이면 한 번만 파싱 (아니거나 파싱 실패 시 v1 protobuf로 간주)
+        rows = None
+        if _is_xml(fp):
+            try:
+                rows = _xml_to_rows(fp, src, base_epoch)
+            except ET.ParseError:
+                rows = None
 
-        if not is_xml:
+        if rows is None:
             # v1 protobuf 시도
             try:
                 stats = _read_pb_v1(fp)
             except Exception:
                 print("[WARN] XML도 아니고 v1 protobuf도 아님 → 스킵:", fp)
                 continue
-            print("[V1 PB] 처리:", fp)
-            _add_v1_to_db(src, base_epoch, stats, db)
+            log("[V1 PB] 처리:", fp)
+            out.extend(_v1_to_rows(src, base_epoch, stats))
             continue
 
-        # XML 처리
-        tree = ET.parse(fp)
-        root = tree.getroot()
-        print("[XML] 처리:", fp)
-        cur = db.cursor()
-
-        for elem in root:
-            tag = elem.tag
-
-            if tag == "packages":
-                for sub in elem:
-                    fullatt = json.dumps(sub.attrib)
-                    t = int(sub.attrib["lastTimeActive"])
-                    finalt = abs(t) if t < 0 else int(base_epoch + t)
-                    pkg = sub.attrib.get("package", "")
-                    tac = sub.attrib.get("timeActive", "")
-                    alc = sub.attrib.get("appLaunchCount", "")
-                    cur.execute(
-                        """
-                        INSERT INTO data
-                        (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,
-                         total_time_visible,app_launch_count,package,types,classs,source,fullatt)
-                        VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-                        """,
-                        (tag, finalt, tac, "", "", "", alc, pkg, "", "", src, fullatt),
-                    )
-
-            elif tag == "configurations":
-                for sub in elem:
-                    fullatt = json.dumps(sub.attrib)
-                    t = int(sub.attrib["lastTimeActive"])
-                    finalt = abs(t) if t < 0 else int(base_epoch + t)
-                    tac = sub.attrib.get("timeActive", "")
-                    cur.execute(
-                        """
-                        INSERT INTO data
-                        (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,
-                         total_time_visible,app_launch_count,package,types,classs,source,fullatt)
-                        VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-                        """,
-                        (tag, finalt, tac, "", "", "", "", "", "", "", src, fullatt),
-                    )
-
-            elif tag == "event-log":
-                for sub in elem:
-                    t = int(sub.attrib["time"])
-                    finalt = abs(t) if t < 0 else int(base_epoch + t)
-                    pkg = sub.attrib.get("package", "")
-                    tipes = sub.attrib.get("type", "")
-                    classy = sub.attrib.get("class", "")
-                    fullatt = json.dumps(sub.attrib)
-                    cur.execute(
-                        """
-                        INSERT INTO data
-                        (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,
-                         total_time_visible,app_launch_count,package,types,classs,source,fullatt)
-                        VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-                        """,
-                        (tag, finalt, "", "", "", "", "", pkg, tipes, classy, src, fullatt),
-                    )
-
-        db.commit()
+        log("[XML] 처리:", fp)
+        out.extend(rows)
+
+    return out
 
 
 # -----------------------------
 # v2 파싱
 # -----------------------------
+_V2_MSG = (
+    usagestatsservice_v2_pb2.IntervalStatsObfuscatedProto()
+    if usagestatsservice_v2_pb2 is not None
+    else None
+)
+
+
 def _read_pb_v2(path: str):
-    if usagestatsservice_v2_pb2 is None:
+    if _V2_MSG is None:
         raise RuntimeError("v2 protobuf 모듈(usagestatsservice_v2_pb2)을 로드하지 못했습니다.")
-    msg = usagestatsservice_v2_pb2.IntervalStatsObfuscatedProto()
-    with open(path, "rb") as f:
-        msg.ParseFromString(f.read())
-    return msg
+    _parse_pb_file(_V2_MSG, path)
+    return _V2_MSG
 
 
-def _add_v2_to_db(sourced: str, base_epoch: int, stats_ob, db: sqlite3.Connection, packages_map: dict):
-    cur = db.cursor()
+def _v2_to_rows(sourced: str, base_epoch: int, stats_ob, packages_map: dict) -> list:
+    rows = []
 
     # packages
     for rec in stats_ob.packages:
+        has = rec.HasField  # 바운드 메서드 1회만 조회
         finalt = ""
-        if rec.HasField("last_time_active_ms"):
+        if has("last_time_active_ms"):
             t = rec.last_time_active_ms
             finalt = abs(t) if t < 0 else t + base_epoch
 
         tac = ""
-        if rec.HasField("total_time_active_ms"):
+        if has("total_time_active_ms"):
             tac = abs(rec.total_time_active_ms)
 
         pkg = _get_string_by_token(packages_map, rec.package_token)
 
         alc = ""
-        if rec.HasField("app_launch_count"):
+        if has("app_launch_count"):
             alc = abs(rec.app_launch_count)
 
-        cur.execute(
-            """
-            INSERT INTO data
-            (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,
-             total_time_visible,app_launch_count,package,types,classs,source,fullatt)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-            """,
-            ("packages", finalt, tac, "", "", "", alc, pkg, "", "", sourced, ""),
-        )
+        rows.append(("packages", finalt, tac, "", "", "", alc, pkg, "", "", sourced, ""))
 
     # configurations
     for conf in stats_ob.configurations:
+        has = conf.HasField
         finalt = ""
-        if conf.HasField("last_time_active_ms"):
+        if has("last_time_active_ms"):
             t = conf.last_time_active_ms
             finalt = abs(t) if t < 0 else t + base_epoch
 
         tac = ""
-        if conf.HasField("total_time_active_ms"):
+        if has("total_time_active_ms"):
             tac = abs(conf.total_time_active_ms)
 
-        cur.execute(
-            """
-            INSERT INTO data
-            (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,
-             total_time_visible,app_launch_count,package,types,classs,source,fullatt)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-            """,
-            ("configurations", finalt, tac, "", "", "", "", "", "", "", sourced, str(conf.config)),
-        )
+        rows.append(("configurations", finalt, tac, "", "", "", "", "", "", "", sourced, str(conf.config)))
 
     # event-log
     for ev in stats_ob.event_log:
+        has = ev.HasField
         finalt = ""
-        if ev.HasField("time_ms"):
+        if has("time_ms"):
             t = ev.time_ms
             finalt = abs(t) if t < 0 else t + base_epoch
 
         pkg = ""
         classy = ""
-        if ev.HasField("package_token"):
+        if has("package_token"):
             pkg = _get_string_by_token(packages_map, ev.package_token)
-        if ev.HasField("class_token"):
+        if has("class_token"):
             classy = _get_string_by_token(packages_map, ev.package_token, ev.class_token)
 
         tipes = ""
-        if ev.HasField("type"):
-            tipes = str(EventType(ev.type)) if ev.type <= max(EventType).value else str(ev.type)
-
-        cur.execute(
-            """
-            INSERT INTO data
-            (usage_type,lastime,timeactive,last_time_service_used,last_time_visible,
-             total_time_visible,app_launch_count,package,types,classs,source,fullatt)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-            """,
-            ("event-log", finalt, "", "", "", "", "", pkg, tipes, classy, sourced, ""),
-        )
+        if has("type"):
+            tipes = _ETYPE_NAMES.get(ev.type) or str(ev.type)
 
-    db.commit()
+        rows.append(("event-log", finalt, "", "", "", "", "", pkg, tipes, classy, sourced, ""))
 
+    return rows
 
-def _parse_v2_dir(root_dir: str, db: sqlite3.Connection):
+
+def _parse_v2_dir(root_dir: str) -> list:
     if usagestatsservice_v2_pb2 is None:
         print("[WARN] v2 protobuf 모듈이 없어 v2 폴더를 건너뜁니다.")
-        return
+        return []
 
     mappings_path = os.path.join(root_dir, "mappings")
     if not os.path.exists(mappings_path):
         print("[WARN] mappings 파일이 없어 v2 폴더로 보이지 않습니다:", root_dir)
-        return
+        return []
 
     # mappings 로드 → 토큰→문자열 매핑
     mappings = usagestatsservice_v2_pb2.ObfuscatedPackagesProto()
-    with open(mappings_path, "rb") as f:
-        mappings.ParseFromString(f.read())
+    _parse_pb_file(mappings, mappings_path)
 
-    packages_map = {}
-    for pkg in mappings.packages_map:
-        if pkg.HasField("package_token"):
-            packages_map[pkg.package_token] = list(pkg.strings)
+    # repeated 필드 컨테이너는 인덱싱이 되므로 list()로 복사하지 않음
+    packages_map = {
+        pkg.package_token: pkg.strings
+        for pkg in mappings.packages_map
+        if pkg.HasField("package_token")
+    }
 
     # 실제 데이터 파일들
-    for fp in glob.iglob(os.path.join(root_dir, "**"), recursive=True):
-        if not os.path.isfile(fp):
-            continue
-
-        name = os.path.basename(fp)
+    out = []
+    for entry, src in _iter_files(root_dir):
+        fp, name = entry.path, entry.name
         if name in ("version", "migrated", "mappings"):
             continue
 
-        # source 구분
-        if "daily" in fp:
-            src = "daily"
-        elif "weekly" in fp:
-            src = "weekly"
-        elif "monthly" in fp:
-            src = "monthly"
-        elif "yearly" in fp:
-            src = "yearly"
-        else:
-            src = ""
-
         try:
             base_epoch = int(name)
         except Exception:
@@ -501,26 +527,41 @@ def _parse_v2_dir(root_dir: str, db: sqlite3.Connection):
             print("[WARN] v2 protobuf 파싱 실패:", fp, ":", e)
             continue
 
-        print("[V2 PB] 처리:", fp)
-        _add_v2_to_db(src, base_epoch, stats_ob, db, packages_map)
+        log("[V2 PB] 처리:", fp)
+        out.extend(_v2_to_rows(src, base_epoch, stats_ob, packages_map))
+
+    return out
+
+
+def _parse_root(root: str) -> list:
+    """루트 하나 파싱 → data 행 목록 (워커 프로세스에서 실행, DB는 건드리지 않음)"""
+    print("\n=== 폴더 처리 중:", root, "===")
+    if os.path.exists(os.path.join(root, "mappings")):
+        return _parse_v2_dir(root)
+    return _parse_xml_or_v1_dir(root)
 
 
 # -----------------------------
 # 메인
 # -----------------------------
 def main():
+    ap = argparse.ArgumentParser(description="usagestats (XML / protobuf v1·v2) → SQLite 변환")
+    ap.add_argument("-v", "--verbose", action="store_true", help="파일별 처리 로그 출력")
+    args = ap.parse_args()
+
+    global VERBOSE
+    VERBOSE = args.verbose
+
     if not os.path.isdir(USAGESTATS_ROOT):
         print("[ERROR] 'data/usagestats' 폴더를 찾지 못했습니다:", USAGESTATS_ROOT)
         return
 
-    db = init_db(DB_PATH)
-
     roots = []
 
     # 1) data/usagestats 바로 아래가 v1/Xml 구조이거나 mappings가 있으면 루트로 사용
     if any(
         os.path.isdir(os.path.join(USAGESTATS_ROOT, d))
-        for d in ("daily", "weekly", "monthly", "yearly")
+        for d in INTERVALS
     ) or os.path.exists(os.path.join(USAGESTATS_ROOT, "mappings")):
         roots.append(USAGESTATS_ROOT)
 
@@ -532,15 +573,22 @@ def main():
 
     if not roots:
         print("[ERROR] usagestats 폴더 구조를 인식하지 못했습니다.")
-        db.close()
         return
 
-    for root in roots:
-        print("\n=== 폴더 처리 중:", root, "===")
-        if os.path.exists(os.path.join(root, "mappings")):
-            _parse_v2_dir(root, db)
-        else:
-            _parse_xml_or_v1_dir(root, db)
+    db = init_db(DB_PATH)
+
+    # 루트별 파싱은 프로세스 병렬, DB 쓰기는 메인 프로세스에서만
+    # (spawn: Windows와 동일한 방식으로 동작)
+    workers = min(len(roots), os.cpu_count() or 1)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=(VERBOSE,)
+    ) as ex:
+        for rows in ex.map(_parse_root, roots):
+            # 루트 단위로 한 번만 커밋 (파일마다 커밋하지 않음)
+            db.execute("BEGIN")
+            db.executemany(INSERT_SQL, rows)
+            db.execute("COMMIT")
 
     cur = db.cursor()
     cur.execute("SELECT COUNT(*) FROM data")
@@ -22,8 +22,11 @@ applicationState.db 에서 iOS 스냅샷 정보를 추출해서
 import argparse
 import sqlite3
 import plistlib
+import math
+import time
+from operator import itemgetter
 from plistlib import UID
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 import csv
 
@@ -31,12 +34,33 @@ import csv
 COCOA_EPOCH = datetime(2001, 1, 1)  # 2001-01-01 00:00:00 UTC 기준
 LOCAL_OFFSET_HOURS = 9              # KST 로 보고 싶으면 9, UTC로만 보고 싶으면 0
 
+# Cocoa 초 → 로컬 시각 Unix 초 (978307200 = 2001-01-01 의 Unix 시각)
+EPOCH_OFFSET_SECS = int((COCOA_EPOCH - datetime(1970, 1, 1)).total_seconds()) + LOCAL_OFFSET_HOURS * 3600
+
 # ★ 새로 추가된 부분: 현재 스크립트 기준 기본 경로 설정
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 DEFAULT_DB_PATH = DATA_DIR / "applicationState.db"
 DEFAULT_OUT_PATH = DATA_DIR / "appstate_snapshots.csv"
 
+# extract_all_snapshots() 가 반환하는 튜플 행의 컬럼 순서 (CSV 헤더와 동일)
+FIELDNAMES = ["Creation Date", "Bundle ID", "Snapshot Group", "Relative Path", "Snapshot Index"]
+
+
+def format_cocoa_time(sec) -> str:
+    """
+    Cocoa 초(NS.time) → "YYYY-MM-DD HH:MM:SS.mmm" (로컬 오프셋 적용)
+    datetime + strftime 대신 정수 연산 + time.gmtime 사용.
+    마이크로초 반올림은 timedelta(seconds=sec) 와 같은 방식(modf 후 반올림)이라 결과가 동일하다.
+    """
+    frac, whole = math.modf(sec)
+    whole, us = divmod(int(whole) * 1_000_000 + round(frac * 1_000_000), 1_000_000)
+    t = time.gmtime(whole + EPOCH_OFFSET_SECS)
+    return (
+        f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} "
+        f"{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}.{us // 1000:03d}"
+    )
+
 
 def decode_snapshot_manifest_blob(blob: bytes):
     """
@@ -56,55 +80,60 @@ def decode_snapshot_manifest_blob(blob: bytes):
     # 1) bplist 디코드 (중첩 bplist 대응: 한 번 더 bplist00 이 나오면 한 번 더 loads)
     inner = plistlib.loads(blob)
     if isinstance(inner, (bytes, bytearray)) and inner.startswith(b"bplist00"):
-        archive = plistlib.loads(inner)
+        # 헤더를 이미 확인했으므로 포맷 자동 판별 생략
+        archive = plistlib.loads(inner, fmt=plistlib.FMT_BINARY)
     else:
         archive = inner
 
     objects = archive["$objects"]
     top = archive["$top"]
 
+    # 루프에서 반복되는 $objects 인덱싱 / 전역 UID 조회를 지역 바인딩으로
+    obj = objects.__getitem__
+    _UID = UID
+    fmt_time = format_cocoa_time
+
     root_uid = top["root"]
     if not isinstance(root_uid, UID):
         raise ValueError("unexpected root UID type")
 
-    root = objects[root_uid.data]
+    root = obj(root_uid.data)
 
     # 루트 객체 안에 snapshots 딕셔너리 있음
     snapshots_uid = root["snapshots"]
-    snapshots_dict = objects[snapshots_uid.data]
+    snapshots_dict = obj(snapshots_uid.data)
 
     keys = snapshots_dict["NS.keys"]       # 각 그룹 이름 (UID 리스트)
     vals = snapshots_dict["NS.objects"]    # 각 그룹에 대한 스냅샷 리스트 (UID 리스트)
 
     rows = []
-    offset = timedelta(hours=LOCAL_OFFSET_HOURS)
 
     for key_uid, val_uid in zip(keys, vals):
-        group_name = objects[key_uid.data]            # 예: "sceneID:ph.telegra.Telegraph-default"
-        group_obj = objects[val_uid.data]             # {'identifier': ..., 'snapshots': UID(...)}
+        group_name = obj(key_uid.data)               # 예: "sceneID:ph.telegra.Telegraph-default"
+        group_obj = obj(val_uid.data)                # {'identifier': ..., 'snapshots': UID(...)}
         snaplist_uid = group_obj["snapshots"]
-        snaplist = objects[snaplist_uid.data]["NS.objects"]  # 스냅샷 객체 UID 리스트
+        snaplist = obj(snaplist_uid.data)["NS.objects"]  # 스냅샷 객체 UID 리스트
+        if not snaplist:
+            continue
 
         for idx, snap_uid in enumerate(snaplist):
-            snap = objects[snap_uid.data]
+            snap = obj(snap_uid.data)
 
             # creationDate → {'NS.time': float}
             creation_dt_str = ""
             cd_uid = snap.get("creationDate")
-            if isinstance(cd_uid, UID):
-                cd_obj = objects[cd_uid.data]
+            if type(cd_uid) is _UID:
+                cd_obj = obj(cd_uid.data)
                 sec = cd_obj.get("NS.time")
                 if isinstance(sec, (int, float)):
-                    utc_dt = COCOA_EPOCH + timedelta(seconds=sec)
-                    local_dt = utc_dt + offset
                     # 엑셀/판다스에서 보기 좋은 포맷
-                    creation_dt_str = local_dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                    creation_dt_str = fmt_time(sec)
 
             # relativePath → '*.ktx'
             rel_path = ""
             rel_uid = snap.get("relativePath")
-            if isinstance(rel_uid, UID):
-                rel_path = objects[rel_uid.data]
+            if type(rel_uid) is _UID:
+                rel_path = obj(rel_uid.data)
 
             rows.append(
                 {
@@ -124,42 +153,35 @@ def extract_all_snapshots(db_path: Path):
     모든 앱의 스냅샷 정보를 추출한다.
 
     반환 형식: [
-        {
-            "Creation Date": str,
-            "Bundle ID": str,
-            "Snapshot Group": str,
-            "Relative Path": str,
-            "Snapshot Index": int,
-        },
+        (Creation Date, Bundle ID, Snapshot Group, Relative Path, Snapshot Index),
         ...
     ]
+    (튜플 순서 = FIELDNAMES)
     """
     con = sqlite3.connect(str(db_path))
     cur = con.cursor()
 
-    # 1) key_tab 에서 'XBApplicationSnapshotManifest' 키 id 찾기
-    cur.execute("SELECT id FROM key_tab WHERE key='XBApplicationSnapshotManifest';")
-    row = cur.fetchone()
-    if not row:
-        con.close()
-        raise SystemExit("[!] key_tab 에 XBApplicationSnapshotManifest 키가 없습니다.")
-    manifest_key_id = row[0]
-
-    # 2) kvs + application_identifier_tab 조인
+    # 1) kvs + application_identifier_tab + key_tab 조인 (키 id 조회까지 한 번에)
+    #    증거 DB 이므로 인덱스 생성 등 쓰기 작업은 하지 않는다.
     query = """
         SELECT
             kvs.value,                              -- NSKeyedArchiver bplist blob
             application_identifier_tab.application_identifier AS bundle_id
         FROM kvs
+        JOIN key_tab
+          ON kvs.key = key_tab.id
         JOIN application_identifier_tab
           ON kvs.application_identifier = application_identifier_tab.id
-        WHERE kvs.key = ?
+        WHERE key_tab.key = 'XBApplicationSnapshotManifest'
     """
-    cur.execute(query, (manifest_key_id,))
+    cur.execute(query)
 
     all_rows = []
+    found = False
 
-    for value_blob, bundle_id in cur.fetchall():
+    # fetchall() 없이 커서를 그대로 순회 (blob 전체를 한꺼번에 메모리에 올리지 않음)
+    for value_blob, bundle_id in cur:
+        found = True
         try:
             # decode_snapshot_manifest_blob() 은 이미 위에서 정의되어 있음
             snaps = decode_snapshot_manifest_blob(value_blob)
@@ -169,26 +191,26 @@ def extract_all_snapshots(db_path: Path):
 
         for snap in snaps:
             all_rows.append(
-                {
-                    "Creation Date": snap["creation_date_local"],
-                    "Bundle ID": bundle_id,
-                    "Snapshot Group": snap["snapshot_group"],
-                    "Relative Path": snap["relative_path"],
-                    "Snapshot Index": snap["snapshot_index"],
-                }
+                (
+                    snap["creation_date_local"],
+                    bundle_id,
+                    snap["snapshot_group"],
+                    snap["relative_path"],
+                    snap["snapshot_index"],
+                )
             )
 
+    # 결과가 없을 때만 키 존재 여부 확인 (기존과 같은 종료 메시지)
+    if not found:
+        cur.execute("SELECT 1 FROM key_tab WHERE key='XBApplicationSnapshotManifest';")
+        if not cur.fetchone():
+            con.close()
+            raise SystemExit("[!] key_tab 에 XBApplicationSnapshotManifest 키가 없습니다.")
+
     con.close()
 
-    # 3) 정렬 (시간 → Bundle ID → 그룹 → 인덱스 순)
-    all_rows.sort(
-        key=lambda r: (
-            r["Creation Date"],
-            r["Bundle ID"],
-            r["Snapshot Group"],
-            r["Snapshot Index"],
-        )
-    )
+    # 2) 정렬 (시간 → Bundle ID → 그룹 → 인덱스 순)
+    all_rows.sort(key=itemgetter(0, 1, 2, 4))
 
     return all_rows
 
@@ -201,13 +223,10 @@ def write_csv(rows, out_path: Path):
     # 출력 폴더가 없으면 생성 (특히 ./data 사용 시)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    fieldnames = ["Creation Date", "Bundle ID", "Snapshot Group", "Relative Path", "Snapshot Index"]
-
     with out_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        writer.writerows(rows)
 
     print(f"[+] CSV 저장 완료: {out_path}")
 
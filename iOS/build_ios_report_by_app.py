@@ -16,19 +16,29 @@ iOS Forensic Report Generator - By Application
 """
 
 import argparse
+import os
 import sqlite3
 import subprocess
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import pandas as pd
 
-from kc_to_sqlite import convert_and_write
-from appstate_snapshots import extract_all_snapshots
+try:
+    import ahocorasick  # Optional: pyahocorasick for multi-pattern path matching
+except ImportError:
+    ahocorasick = None
+
+from kc_to_sqlite import convert_and_write, get_columns
+from appstate_snapshots import FIELDNAMES, extract_all_snapshots
 
 # Allowed tolerance between end_kst_iso and creationDate, in seconds
 MATCH_THRESHOLD_SECONDS = 60
 
+# Applications handed to each report worker at a time
+RENDER_CHUNKSIZE = 8
+
 # ------------------------------------------------------------
 # Common path setup: script location and data folder
 # ------------------------------------------------------------
@@ -39,17 +49,45 @@ DATA_DIR = BASE_DIR / "data"
 # ------------------------------------------------------------
 # 1. KTX to PNG conversion
 # ------------------------------------------------------------
+def _convert_ktx(exe_path: Path, ktx: Path, png_path: Path):
+    """Convert one KTX file; return png_path on success, otherwise None."""
+    # ios_ktx2png.exe only documents the "<input> <output>" form (no stdin/list
+    # batch mode), so one process per file is kept; startup cost is overlapped
+    # by the thread pool and skipped entirely for up-to-date PNGs.
+    cmd = [str(exe_path), str(ktx), str(png_path)]
+    try:
+        subprocess.run(
+            cmd,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return png_path
+    except Exception as e:
+        print(f"[ERROR] Conversion failed: {ktx} ({e})")
+        return None
+
+
+def _png_is_current(ktx: Path, png_path: Path) -> bool:
+    """True when png_path exists and is at least as new as its source KTX."""
+    try:
+        return png_path.stat().st_mtime >= ktx.stat().st_mtime
+    except OSError:
+        return False
+
+
 def run_ios_ktx2png_on_folder(base_dir: Path, exe_name: str = "ios_ktx2png.exe"):
     exe_path = BASE_DIR / exe_name  # Assume the executable is in the same folder as this script
     if not exe_path.exists():
         raise SystemExit(f"[!] Could not find {exe_name} in {BASE_DIR}.")
 
     ktx_files = sorted(base_dir.rglob("*.ktx"))
-    png_files = []
 
     if not ktx_files:
         print("[!] No KTX files found.")
-        return png_files
+        return []
+
+    tasks = []
 
     for ktx in ktx_files:
         # macOS AppleDouble files (._*) contain metadata, not image data.
@@ -64,23 +102,69 @@ def run_ios_ktx2png_on_folder(base_dir: Path, exe_name: str = "ios_ktx2png.exe")
             continue
 
         png_path = ktx.with_suffix(ktx.suffix + ".png")
-        cmd = [str(exe_path), str(ktx), str(png_path)]
-
-        try:
-            subprocess.run(
-                cmd,
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-            png_files.append(png_path)
-        except Exception as e:
-            print(f"[ERROR] Conversion failed: {ktx} ({e})")
+        tasks.append((ktx, png_path, _png_is_current(ktx, png_path)))
+
+    # Only convert KTX files without an up-to-date PNG (incremental re-runs)
+    todo = [(ktx, png_path) for ktx, png_path, current in tasks if not current]
+    if len(todo) < len(tasks):
+        print(f"[SKIP] {len(tasks) - len(todo)} PNG files are up to date; reusing them")
+
+    # Each task just waits on the converter process, so threads are enough.
+    # map() keeps the results in the original (sorted) order.
+    workers = min(32, os.cpu_count() or 4)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        converted = iter(list(ex.map(lambda t: _convert_ktx(exe_path, *t), todo)))
+
+    png_files = [png_path if current else next(converted) for _, png_path, current in tasks]
+    png_files = [p for p in png_files if p is not None]
 
     print(f"[OK] KTX to PNG conversion completed: {len(png_files)}PNG files generated")
     return png_files
 
 
+# ------------------------------------------------------------
+# Utility: read SQL results with Arrow-backed columns when available
+# ------------------------------------------------------------
+def read_sql_arrow(sql: str, conn, params=None) -> pd.DataFrame:
+    """
+    pd.read_sql_query with dtype_backend="pyarrow" so text columns are stored
+    as Arrow strings instead of one Python object per cell.
+    Falls back to the default dtypes when pandas < 2.0 or pyarrow is missing.
+    """
+    try:
+        return pd.read_sql_query(sql, conn, params=params, dtype_backend="pyarrow")
+    except (TypeError, ImportError):
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def arrow_to_display(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert Arrow-backed columns back to NumPy/object columns for to_html, so the
+    report looks the same as with default dtypes: fixed float decimals
+    (e.g. 669.017440 instead of 669.01744) and NaN instead of <NA>.
+    """
+    arrow_cols = [c for c, t in df.dtypes.items() if getattr(t, "storage", None) == "pyarrow"]
+    if not arrow_cols:
+        return df
+    df = df.copy()
+    for c in arrow_cols:
+        s = df[c]
+        if pd.api.types.is_integer_dtype(s.dtype) and not s.hasnans:
+            df[c] = s.astype("int64")
+        elif pd.api.types.is_numeric_dtype(s.dtype):
+            df[c] = s.astype("float64")
+        else:
+            df[c] = s.astype(object).where(s.notna(), float("nan"))
+    return df
+
+
+def as_string(s: pd.Series) -> pd.Series:
+    """Return s in a pandas string dtype, keeping Arrow/string columns as they are."""
+    if s.dtype != object and pd.api.types.is_string_dtype(s.dtype):
+        return s
+    return s.astype("string")
+
+
 # ------------------------------------------------------------
 # Utility: automatically find datetime columns and convert them with to_datetime
 # ------------------------------------------------------------
@@ -147,7 +231,7 @@ def parse_knowledgec(base_dir: Path) -> pd.DataFrame:
     table = "events"  # Default table name created by kc_to_sqlite
 
     # Find the stream column
-    cols = pd.read_sql_query(f"PRAGMA table_info({table});", conn)["name"].tolist()
+    cols = get_columns(conn, table)
     stream_col = None
     for c in cols:
         if "stream" in c.lower():
@@ -159,13 +243,35 @@ def parse_knowledgec(base_dir: Path) -> pd.DataFrame:
         print("[!] Could not find a stream-related column.")
         return pd.DataFrame()
 
-    # Filter /app/usage events
-    query = f"""
-        SELECT *
-        FROM {table}
-        WHERE {stream_col} LIKE '%app/usage%'
-    """
-    df = pd.read_sql_query(query, conn)
+    # Read only the columns used by the report. start_mac/end_mac (raw Mac Absolute
+    # Time) are dropped from the KnowledgeC tables; the UTC/KST ISO strings cover them.
+    wanted = [
+        "event_pk",
+        stream_col,
+        "bundle_id",
+        "valuestring",
+        "start_utc_iso",
+        "end_utc_iso",
+        "start_kst_iso",
+        "end_kst_iso",
+        "duration_sec",
+    ]
+    select_cols = ", ".join(f'"{c}"' for c in dict.fromkeys(wanted) if c in cols)
+
+    # Filter /app/usage events: exact match first (can use idx_events_stream),
+    # substring match only when the exact stream name is not present
+    df = read_sql_arrow(
+        f"SELECT {select_cols} FROM {table} WHERE {stream_col} = ?",
+        conn,
+        params=("/app/usage",),
+    )
+    if df.empty:
+        query = f"""
+            SELECT {select_cols}
+            FROM {table}
+            WHERE {stream_col} LIKE '%app/usage%'
+        """
+        df = read_sql_arrow(query, conn)
     conn.close()
 
     print(f"[KC] {table}.{stream_col} /app/usage events extracted from {len(df)}")
@@ -181,16 +287,17 @@ def parse_knowledgec(base_dir: Path) -> pd.DataFrame:
             bundle_source = c
             break
 
-    df["Bundle ID"] = pd.NA
-
-    if bundle_source is not None:
-        df["Bundle ID"] = df[bundle_source]
-
+    # Use bundle_source, falling back to valuestring where it is missing or empty.
+    # Kept in the pandas string dtype so strip/filter run as one vectorized pass.
+    bid = as_string(df[bundle_source]) if bundle_source is not None else None
     if "valuestring" in df.columns:
-        df["Bundle ID"] = df["Bundle ID"].fillna(df["valuestring"])
+        vs = as_string(df["valuestring"])
+        bid = vs if bid is None else bid.where(bid.fillna("") != "", vs)
+    if bid is None:
+        bid = pd.Series(pd.NA, index=df.index, dtype="string")
 
-    df["Bundle ID"] = df["Bundle ID"].astype(str).str.strip()
-    df = df[df["Bundle ID"] != ""]
+    df["Bundle ID"] = bid.str.strip()
+    df = df[df["Bundle ID"].fillna("") != ""]
     print(f"[KC] /app/usage events with populated Bundle ID: {len(df)}")
 
     return df
@@ -215,7 +322,7 @@ def parse_appstate(base_dir: Path) -> pd.DataFrame:
 
     print(f"[APPSTATE] Input DB: {db_path}")
     rows = extract_all_snapshots(db_path)
-    df = pd.DataFrame(rows)
+    df = pd.DataFrame(rows, columns=FIELDNAMES)
 
     if df.empty:
         return df
@@ -225,7 +332,7 @@ def parse_appstate(base_dir: Path) -> pd.DataFrame:
         before = len(df)
         df = df[
             ~df["Snapshot Group"].str.contains(
-                r"\{DEFAULT GROUP\}", case=False, na=False
+                "{DEFAULT GROUP}", case=False, na=False, regex=False
             )
         ]
         print(
@@ -239,159 +346,7 @@ def parse_appstate(base_dir: Path) -> pd.DataFrame:
 # ------------------------------------------------------------
 # 4. Map by application and generate HTML
 # ------------------------------------------------------------
-def build_html_by_app(
-    base_dir: Path,
-    kc_df: pd.DataFrame,
-    appstate_df: pd.DataFrame,
-    png_files,
-    html_name: str,
-):
-    html_path = base_dir / html_name
-
-    kc_grouped = defaultdict(lambda: pd.DataFrame())
-    app_grouped = defaultdict(lambda: pd.DataFrame())
-
-    # ---- KnowledgeC: group by Bundle ID ----
-    if not kc_df.empty and "Bundle ID" in kc_df.columns:
-        for b, group in kc_df.groupby("Bundle ID"):
-            b_str = str(b).strip()
-            if b_str:
-                kc_grouped[b_str] = group
-
-    # ---- applicationState: group by Bundle ID ----
-    if not appstate_df.empty:
-        bundle_col2 = "Bundle ID"
-        if bundle_col2 not in appstate_df.columns:
-            for c in appstate_df.columns:
-                if "bundle" in c.lower():
-                    bundle_col2 = c
-                    break
-
-        for b, group in appstate_df.groupby(bundle_col2):
-            b_str = str(b).strip()
-            if b_str:
-                app_grouped[b_str] = group
-
-    # ---- PNG files: map by Bundle ID in path ----
-    png_map = defaultdict(list)
-    for p in png_files:
-        p_str = str(p)
-        for b in set(list(kc_grouped.keys()) + list(app_grouped.keys())):
-            if b and b in p_str:
-                png_map[b].append(p)
-
-    # ---- Generate HTML sections ----
-    sections = []
-    bundle_ids = sorted(set(list(kc_grouped.keys()) + list(app_grouped.keys())))
-
-    for b in bundle_ids:
-        sections.append(f"<h2>{b}</h2>")
-
-        # ------ 1. KnowledgeC Events: calculate the latest end_kst_iso (or fallback) ------
-        last_end_ts = None
-        df1_display = None
-        if not kc_grouped[b].empty:
-            df1 = kc_grouped[b].copy()
-
-            # Prefer end_kst_iso first,
-            # and fall back to end_utc_iso / endDate only when needed
-            end_col, end_series = find_datetime_series(
-                df1,
-                preferred_cols=["end_kst_iso", "end_utc_iso", "endDate", "end_date"],
-                fallback_keywords=["end", "kst"],
-            )
-            if end_series is not None:
-                last_end_ts = end_series.max()
-
-            # Keep the display unchanged
-            df1_display = df1
-            html1 = df1_display.to_html(
-                index=False, border=1, classes=["kc-table"], justify="center"
-            )
-            sections.append("<h3>KnowledgeC /app/usage Events</h3>" + html1)
-        else:
-            sections.append("<p><i>No /app/usage events are available for this application.</i></p>")
-
-        # ------ 2. ApplicationState snapshots: apply color to creationDate ------
-        if not app_grouped[b].empty:
-            df2 = app_grouped[b].copy()
-
-            # Find candidate creationDate columns, such as creation_utc_iso or creationDate
-            creation_col, creation_series = find_datetime_series(
-                df2,
-                preferred_cols=[
-                    "creation_utc_iso",
-                    "creationDate",
-                    "creation_date",
-                    "snapshot_utc_iso",
-                ],
-                fallback_keywords=["creation"],
-            )
-
-            df2_display = df2.copy()
-
-            if creation_col is not None and last_end_ts is not None:
-                # Remove timezone information from the reference end time for a naive comparison
-                last_end_ref = last_end_ts
-                if getattr(last_end_ref, "tzinfo", None) is not None:
-                    last_end_ref = last_end_ref.tz_localize(None)
-
-                def color_creation(val):
-                    ts = pd.to_datetime(val, errors="coerce")
-                    if pd.isna(ts):
-                        return val
-
-                    # Remove timezone information when tz-aware
-                    if getattr(ts, "tzinfo", None) is not None:
-                        ts_local = ts.tz_localize(None)
-                    else:
-                        ts_local = ts
-
-                    delta = abs((ts_local - last_end_ref).total_seconds())
-                    if delta <= MATCH_THRESHOLD_SECONDS:
-                        # Within 1 minute (60 seconds): blue
-                        return f'<span style="color:blue;font-weight:bold">{val}</span>'
-                    else:
-                        # Larger differences: red
-                        return f'<span style="color:red;font-weight:bold">{val}</span>'
-
-                df2_display[creation_col] = (
-                    df2_display[creation_col].astype(str).apply(color_creation)
-                )
-
-            html2 = df2_display.to_html(
-                index=False,
-                border=1,
-                classes=["appstate-table"],
-                justify="center",
-                escape=False,  # Keep span HTML as-is
-            )
-            sections.append("<h3>ApplicationState Snapshots</h3>" + html2)
-        else:
-            if png_map[b]:
-                sections.append(
-                    "<p><i>No snapshot metadata is available from applicationState.db, "
-                    "but snapshot images extracted from the file system are shown below.</i></p>"
-                )
-            else:
-                sections.append("<p><i>No snapshot data is available.</i></p>")
-
-        # ------ 3) Snapshot Images ------
-        if png_map[b]:
-            imgs = "".join(
-                f'<figure><img src="{p.relative_to(base_dir)}" '
-                f'width="240"><figcaption>{p.name}</figcaption></figure>'
-                for p in png_map[b]
-            )
-            sections.append(
-                "<h3>Snapshot Images</h3>"
-                "<div class='snapshots'>" + imgs + "</div>"
-            )
-
-        sections.append("<hr>")
-
-    # ---- Write final HTML ----
-    html = f"""<!DOCTYPE html>
+_HTML_HEAD = """<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="utf-8">
@@ -418,11 +373,240 @@ th {{background:#f0f0f0;}}
 <body>
 <h1>iOS Forensic Report - By Application</h1>
 <p>Base directory: {base_dir}</p>
-{''.join(sections)}
+"""
+
+_HTML_TAIL = """
 </body>
 </html>"""
 
-    html_path.write_text(html, encoding="utf-8")
+
+# Per-PNG strings computed once: str(path) for matching, relative path and name for the report
+PngInfo = namedtuple("PngInfo", ["path", "path_str", "rel", "name"])
+
+
+def map_pngs_by_bundle(png_infos, bundles):
+    """
+    Map each PngInfo to every Bundle ID that appears as a substring of its path.
+    Paths that cannot contain any Bundle ID are dropped first; the rest get a
+    single Aho-Corasick pass when pyahocorasick is installed, otherwise each
+    Bundle ID is checked against the path.
+    """
+    png_map = defaultdict(list)
+    bundles = [b for b in bundles if b]
+    if not bundles:
+        return png_map
+
+    # Coarse gate: a path containing a Bundle ID also contains its first label
+    # ("com", "net", ...), so paths without any of these few tokens are skipped.
+    bundle_prefixes = {b.split(".", 1)[0] for b in bundles}
+    png_infos = [
+        info for info in png_infos
+        if any(pref in info.path_str for pref in bundle_prefixes)
+    ]
+
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for b in bundles:
+            automaton.add_word(b, b)
+        automaton.make_automaton()
+        for info in png_infos:
+            # A Bundle ID can occur more than once in a path; record the PNG once.
+            for b in dict.fromkeys(b for _, b in automaton.iter(info.path_str)):
+                png_map[b].append(info)
+    else:
+        for info in png_infos:
+            p_str = info.path_str
+            for b in bundles:
+                if b in p_str:
+                    png_map[b].append(info)
+
+    return png_map
+
+
+def _render_app(task):
+    """
+    Render one application's section.
+    task: (bundle_id, kc_group or None, app_group or None, list of PngInfo)
+    Top-level so it can run in a worker process; returns (bundle_id, html_fragment).
+    """
+    b, kc_group, app_group, pngs = task
+    parts = []
+
+    parts.append(f"<h2>{b}</h2>")
+
+    # ------ 1. KnowledgeC Events: calculate the latest end_kst_iso (or fallback) ------
+    last_end_ts = None
+    df1_display = None
+    if kc_group is not None and not kc_group.empty:
+        df1 = kc_group.copy()
+
+        # Prefer end_kst_iso first,
+        # and fall back to end_utc_iso / endDate only when needed
+        end_col, end_series = find_datetime_series(
+            df1,
+            preferred_cols=["end_kst_iso", "end_utc_iso", "endDate", "end_date"],
+            fallback_keywords=["end", "kst"],
+        )
+        if end_series is not None:
+            last_end_ts = end_series.max()
+
+        # Keep the display unchanged: numpy float formatting and NaN for missing
+        # values, even when the events were read with Arrow-backed dtypes
+        df1_display = arrow_to_display(df1)
+        html1 = df1_display.to_html(
+            index=False, border=1, classes=["kc-table"], justify="center", na_rep="NaN"
+        )
+        parts.append("<h3>KnowledgeC /app/usage Events</h3>" + html1)
+    else:
+        parts.append("<p><i>No /app/usage events are available for this application.</i></p>")
+
+    # ------ 2. ApplicationState snapshots: apply color to creationDate ------
+    if app_group is not None and not app_group.empty:
+        df2 = app_group.copy()
+
+        # Find candidate creationDate columns, such as creation_utc_iso or creationDate
+        creation_col, creation_series = find_datetime_series(
+            df2,
+            preferred_cols=[
+                "creation_utc_iso",
+                "creationDate",
+                "creation_date",
+                "snapshot_utc_iso",
+            ],
+            fallback_keywords=["creation"],
+        )
+
+        df2_display = df2.copy()
+
+        if creation_col is not None and last_end_ts is not None:
+            # Remove timezone information from the reference end time for a naive comparison
+            last_end_ref = last_end_ts
+            if getattr(last_end_ref, "tzinfo", None) is not None:
+                last_end_ref = last_end_ref.tz_localize(None)
+
+            def color_creation(val):
+                ts = pd.to_datetime(val, errors="coerce")
+                if pd.isna(ts):
+                    return val
+
+                # Remove timezone information when tz-aware
+                if getattr(ts, "tzinfo", None) is not None:
+                    ts_local = ts.tz_localize(None)
+                else:
+                    ts_local = ts
+
+                delta = abs((ts_local - last_end_ref).total_seconds())
+                if delta <= MATCH_THRESHOLD_SECONDS:
+                    # Within 1 minute (60 seconds): blue
+                    return f'<span style="color:blue;font-weight:bold">{val}</span>'
+                else:
+                    # Larger differences: red
+                    return f'<span style="color:red;font-weight:bold">{val}</span>'
+
+            df2_display[creation_col] = (
+                df2_display[creation_col].astype(str).apply(color_creation)
+            )
+
+        html2 = df2_display.to_html(
+            index=False,
+            border=1,
+            classes=["appstate-table"],
+            justify="center",
+            escape=False,  # Keep span HTML as-is
+        )
+        parts.append("<h3>ApplicationState Snapshots</h3>" + html2)
+    else:
+        if pngs:
+            parts.append(
+                "<p><i>No snapshot metadata is available from applicationState.db, "
+                "but snapshot images extracted from the file system are shown below.</i></p>"
+            )
+        else:
+            parts.append("<p><i>No snapshot data is available.</i></p>")
+
+    # ------ 3) Snapshot Images ------
+    if pngs:
+        imgs = "".join(
+            f'<figure><img src="{info.rel}" '
+            f'width="240"><figcaption>{info.name}</figcaption></figure>'
+            for info in pngs
+        )
+        parts.append(
+            "<h3>Snapshot Images</h3>"
+            "<div class='snapshots'>" + imgs + "</div>"
+        )
+
+    parts.append("<hr>")
+
+    return b, "".join(parts)
+
+
+def build_html_by_app(
+    base_dir: Path,
+    kc_df: pd.DataFrame,
+    appstate_df: pd.DataFrame,
+    png_files,
+    html_name: str,
+):
+    html_path = base_dir / html_name
+
+    kc_grouped = {}
+    app_grouped = {}
+
+    # ---- KnowledgeC: group by Bundle ID ----
+    # (sort=False: sections are ordered by the sorted bundle list below)
+    if not kc_df.empty and "Bundle ID" in kc_df.columns:
+        kc_grouped = {
+            str(b).strip(): group
+            for b, group in kc_df.groupby("Bundle ID", sort=False)
+            if str(b).strip()
+        }
+
+    # ---- applicationState: group by Bundle ID ----
+    if not appstate_df.empty:
+        bundle_col2 = "Bundle ID"
+        if bundle_col2 not in appstate_df.columns:
+            for c in appstate_df.columns:
+                if "bundle" in c.lower():
+                    bundle_col2 = c
+                    break
+
+        app_grouped = {
+            str(b).strip(): group
+            for b, group in appstate_df.groupby(bundle_col2, sort=False)
+            if str(b).strip()
+        }
+
+    # ---- PNG files: map by Bundle ID in path ----
+    png_infos = [
+        PngInfo(p, str(p), str(p.relative_to(base_dir)), p.name) for p in png_files
+    ]
+    # One sorted Bundle ID list shared by PNG matching and section rendering
+    bundle_ids = sorted(set(kc_grouped) | set(app_grouped))
+    png_map = map_pngs_by_bundle(png_infos, bundle_ids)
+
+    # ---- Generate HTML sections, streamed straight to the output file ----
+    with html_path.open("w", encoding="utf-8") as f:
+        f.write(_HTML_HEAD.format(base_dir=base_dir))
+
+        tasks = [
+            (b, kc_grouped.get(b), app_grouped.get(b), png_map[b]) for b in bundle_ids
+        ]
+
+        # to_html is CPU-bound Python; render sections in worker processes when
+        # there are enough applications to amortize the pool start-up.
+        # map() keeps the fragments in bundle order.
+        workers = min(os.cpu_count() or 1, len(tasks) // RENDER_CHUNKSIZE)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                for _, fragment in ex.map(_render_app, tasks, chunksize=RENDER_CHUNKSIZE):
+                    f.write(fragment)
+        else:
+            for task in tasks:
+                f.write(_render_app(task)[1])
+
+        f.write(_HTML_TAIL)
+
     print(f"[OK] Report generated -> {html_path}")
 
 
@@ -10,44 +10,59 @@ Usage:
 - 생성 테이블:
     - events(event_pk, stream, bundle_id, valuestring, start_mac, end_mac,
              start_utc_iso, end_utc_iso, start_kst_iso, end_kst_iso, duration_sec)
-    - metadata(source_path, generated_at, note, bundle_id_column)
-    - events_preview(샘플 50건)
+    - metadata(source_path, source_mtime_ns, source_size, source_wal, source_shm, converter_version,
+               generated_at, note, bundle_id_column)
+    - events_preview(샘플 50건, events 위의 VIEW)
 """
 
 import argparse
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 
-try:
-    import pandas as pd
-except Exception as e:
-    raise SystemExit("pandas가 필요합니다. pip install pandas 실행 후 다시 시도하세요.") from e
 
+MAC_EPOCH_UNIX = 978307200   # 2001-01-01 00:00:00 UTC 의 Unix 시각
+KST_OFFSET_SECS = 9 * 3600
 
-def mac_to_dt(x):
-    """Mac Absolute Time(초, 기준 2001-01-01 UTC)을 datetime으로 변환."""
-    if pd.isna(x):
-        return pd.NaT
-    try:
-        return datetime(2001, 1, 1) + timedelta(seconds=float(x))
-    except Exception:
-        return pd.NaT
+# 출력 events/metadata 형식 버전. build_query/_us_expr/_iso_expr 등 변환 결과가
+# 바뀌면 올릴 것 → 이전 버전으로 만든 출력 DB는 재사용하지 않고 다시 생성됨
+CONVERTER_VERSION = "2"
+
+
+def _us_expr(col):
+    """SQL 식: Mac Absolute Time(초) → 정수 마이크로초. 숫자가 아니면 NULL.
+    정수부/소수부를 나눠 반올림 (timedelta(seconds=x) 와 같은 방식)."""
+    return (
+        f"CASE WHEN typeof({col}) IN ('integer', 'real') THEN "
+        f"CAST({col} AS INTEGER) * 1000000 "
+        f"+ CAST(round(({col} - CAST({col} AS INTEGER)) * 1000000) AS INTEGER) END"
+    )
+
+
+def _iso_expr(us, offset_secs=0):
+    """SQL 식: 정수 마이크로초 → 'YYYY-MM-DDTHH:MM:SS.ffffffZ' (기존 pandas strftime 출력과 동일 형식)."""
+    frac = f"((({us}) % 1000000) + 1000000) % 1000000"
+    return (
+        f"strftime('%Y-%m-%dT%H:%M:%S', (({us}) - {frac}) / 1000000 + {MAC_EPOCH_UNIX + offset_secs}, 'unixepoch')"
+        f" || '.' || printf('%06d', {frac}) || 'Z'"
+    )
 
 
 def get_columns(conn, table):
-    """PRAGMA table_info로 컬럼 목록 얻게."""
+    """pragma_table_info로 컬럼 목록 얻게 (DataFrame 없이 커서로 바로 읽음)."""
     try:
-        return pd.read_sql_query(f"PRAGMA table_info({table});", conn)["name"].tolist()
+        return [r[0] for r in conn.execute("SELECT name FROM pragma_table_info(?)", (table,))]
     except Exception:
         return []
 
 
-def build_query(src_conn):
-    """스키마 차이를 감안해 동적으로 SELECT 쿼리 생성."""
-    tables = pd.read_sql_query(
-        "SELECT name FROM sqlite_master WHERE type='table';", src_conn
-    )["name"].tolist()
+def build_query(src_conn, schema=None):
+    """스키마 차이를 감안해 동적으로 SELECT 쿼리 생성.
+    schema: ATTACH 된 DB에서 실행할 때 테이블 앞에 붙일 스키마 이름 (예: "src")."""
+    prefix = f"{schema}." if schema else ""
+    tables = [
+        r[0] for r in src_conn.execute("SELECT name FROM sqlite_master WHERE type='table';")
+    ]
 
     has_zsn = "ZSTREAMNAME" in tables
     has_zsmeta = "ZSTRUCTUREDMETADATA" in tables
@@ -74,7 +89,7 @@ def build_query(src_conn):
     if has_zsn:
         select_fields.append("ZSTREAMNAME.ZSTREAMNAME AS stream")
         join_clauses.append(
-            "LEFT JOIN ZSTREAMNAME ON ZOBJECT.ZSTREAMNAME = ZSTREAMNAME.Z_PK"
+            f"LEFT JOIN {prefix}ZSTREAMNAME ON ZOBJECT.ZSTREAMNAME = ZSTREAMNAME.Z_PK"
         )
     else:
         zobj_cols = get_columns(src_conn, "ZOBJECT")
@@ -87,7 +102,7 @@ def build_query(src_conn):
     if has_zsmeta and bundle_col:
         select_fields.append(f"ZSTRUCTUREDMETADATA.{bundle_col} AS bundle_id")
         join_clauses.append(
-            "LEFT JOIN ZSTRUCTUREDMETADATA ON ZOBJECT.ZSTRUCTUREDMETADATA = ZSTRUCTUREDMETADATA.Z_PK"
+            f"LEFT JOIN {prefix}ZSTRUCTUREDMETADATA ON ZOBJECT.ZSTRUCTUREDMETADATA = ZSTRUCTUREDMETADATA.Z_PK"
         )
     else:
         select_fields.append("NULL AS bundle_id")
@@ -95,47 +110,62 @@ def build_query(src_conn):
     sql = f"""
     SELECT
         {", ".join(select_fields)}
-    FROM ZOBJECT
+    FROM {prefix}ZOBJECT
     {" ".join(join_clauses)}
     ORDER BY ZOBJECT.ZSTARTDATE ASC
     """
     return sql, bundle_col or "N/A"
 
 
-def convert_and_write(src_db: Path, out_db: Path):
-    # 입력 열기
+def _source_signature(src_db: Path):
+    """원본 DB 식별값 (경로, mtime_ns, 크기) + 변환기 버전 — 출력 DB metadata 와 비교용 문자열.
+    새 이벤트가 -wal 에만 있으면 본 파일의 mtime/크기는 그대로이므로 -wal/-shm 도 포함."""
+    st = src_db.stat()
+    sig = {
+        "source_path": str(src_db),
+        "source_mtime_ns": str(st.st_mtime_ns),
+        "source_size": str(st.st_size),
+    }
+    for suffix in ("wal", "shm"):
+        try:
+            side = src_db.with_name(f"{src_db.name}-{suffix}").stat()
+            sig[f"source_{suffix}"] = f"{side.st_mtime_ns}:{side.st_size}"
+        except FileNotFoundError:
+            sig[f"source_{suffix}"] = "absent"
+    sig["converter_version"] = CONVERTER_VERSION
+    return sig
+
+
+def _is_up_to_date(out_db: Path, want) -> bool:
+    """out_db metadata 가 원본 식별값 want (변환기 버전 포함) 와 같으면 True. 출력 DB는 읽기 전용으로 연다."""
+    if not out_db.exists():
+        return False
+    try:
+        conn = sqlite3.connect(out_db.resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            marks = ", ".join("?" * len(want))
+            rows = conn.execute(
+                f"SELECT key, value FROM metadata WHERE key IN ({marks})", tuple(want)
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return dict(rows) == want
+
+
+def convert_and_write(src_db: Path, out_db: Path) -> bool:
+    """src_db → out_db 변환. 기존 출력을 재사용했으면 False, 새로 만들었으면 True."""
+    # 원본(-wal/-shm 포함)과 변환기 버전이 그대로면 기존 출력 재사용 (KTX → PNG 증분 변환과 같은 방식)
+    source_sig = _source_signature(src_db)
+    if _is_up_to_date(out_db, source_sig):
+        print(f"[SKIP] 원본 DB/변환기 변경 없음, 기존 출력 재사용: {out_db}")
+        return False
+
+    # 입력 스키마 확인 → SELECT 쿼리 생성 (테이블은 ATTACH 이름 src 로 한정)
     src_conn = sqlite3.connect(str(src_db))
-    sql, bundle_col_name = build_query(src_conn)
-
-    # 쿼리 실행
-    df = pd.read_sql_query(sql, src_conn)
-
-    # 시간 변환
-    df["start_utc"] = df["start_mac"].apply(mac_to_dt)
-    df["end_utc"] = df["end_mac"].apply(mac_to_dt)
-    df["start_kst"] = df["start_utc"] + pd.to_timedelta(9, unit="h")
-    df["end_kst"] = df["end_utc"] + pd.to_timedelta(9, unit="h")
-    df["duration_sec"] = (df["end_utc"] - df["start_utc"]).dt.total_seconds()
-
-    # ISO8601 문자열 컬럼
-    for col in ["start_utc", "end_utc", "start_kst", "end_kst"]:
-        df[col + "_iso"] = df[col].dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-
-    # 출력 스키마 정리
-    out_cols = [
-        "event_pk",
-        "stream",
-        "bundle_id",
-        "valuestring",
-        "start_mac",
-        "end_mac",
-        "start_utc_iso",
-        "end_utc_iso",
-        "start_kst_iso",
-        "end_kst_iso",
-        "duration_sec",
-    ]
-    out_df = df[out_cols].copy()
+    sql, bundle_col_name = build_query(src_conn, schema="src")
+    src_conn.close()
 
     # 출력 DB 준비
     if out_db.exists():
@@ -143,25 +173,67 @@ def convert_and_write(src_db: Path, out_db: Path):
     out_conn = sqlite3.connect(str(out_db))
     cur = out_conn.cursor()
 
-    # events 테이블 저장
-    out_df.to_sql("events", out_conn, if_exists="replace", index=False)
-
-    # metadata 저장
-    meta_df = pd.DataFrame(
-        {
-            "key": ["source_path", "generated_at", "note", "bundle_id_column"],
-            "value": [
-                str(src_db),
-                datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
-                "Mac Absolute Time → UTC/KST ISO8601 변환, duration_sec 포함.",
-                bundle_col_name,
-            ],
-        }
+    # 매번 새로 만드는 출력 DB → 저널/fsync 없이 벌크 적재.
+    # 반드시 main. 으로 한정: 스키마 없이 쓰면 journal_mode/locking_mode 가 ATTACH 한 원본(증거) DB에도 적용됨
+    for pragma in (
+        "PRAGMA main.journal_mode=OFF",
+        "PRAGMA main.synchronous=OFF",
+        "PRAGMA main.locking_mode=EXCLUSIVE",
+        "PRAGMA main.cache_size=-262144",
+        "PRAGMA temp_store=MEMORY",
+    ):
+        cur.execute(pragma)
+
+    # 입력 DB를 붙여서 읽기 → 변환 → 저장을 SQLite 안에서 한 번에 처리 (pandas 경유 없음)
+    cur.execute("ATTACH DATABASE ? AS src", (str(src_db),))
+
+    # 이후 모든 쓰기(events/metadata/preview/인덱스)를 트랜잭션 하나로 묶음
+    cur.execute("BEGIN")
+
+    # events 테이블 저장 (UTC/KST ISO8601 문자열, duration_sec 모두 SQL로 계산)
+    # 행은 SQLite 안에서 한 건씩 흘러가므로 전체 결과를 메모리에 올리지 않는다 (청크 분할 불필요).
+    # 인덱스는 적재가 끝난 뒤 한 번에 만든다.
+    cur.execute(
+        f"""
+        CREATE TABLE events AS
+        SELECT
+            event_pk,
+            stream,
+            bundle_id,
+            valuestring,
+            start_mac,
+            end_mac,
+            {_iso_expr("start_us")} AS start_utc_iso,
+            {_iso_expr("end_us")} AS end_utc_iso,
+            {_iso_expr("start_us", KST_OFFSET_SECS)} AS start_kst_iso,
+            {_iso_expr("end_us", KST_OFFSET_SECS)} AS end_kst_iso,
+            (end_us - start_us) / 1000000.0 AS duration_sec
+        FROM (
+            SELECT
+                q.*,
+                {_us_expr("q.start_mac")} AS start_us,
+                {_us_expr("q.end_mac")} AS end_us
+            FROM ({sql}) AS q
+        )
+        ORDER BY start_mac ASC
+        """
+    )
+
+    # metadata 저장 (to_sql 은 내부에서 commit 하므로 트랜잭션 유지를 위해 직접 INSERT)
+    # source_* 값은 다음 실행에서 재변환 여부 판단에 사용
+    cur.execute('CREATE TABLE metadata ("key" TEXT, "value" TEXT);')
+    cur.executemany(
+        "INSERT INTO metadata VALUES (?, ?);",
+        [
+            *source_sig.items(),
+            ("generated_at", datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")),
+            ("note", "Mac Absolute Time → UTC/KST ISO8601 변환, duration_sec 포함."),
+            ("bundle_id_column", bundle_col_name),
+        ],
     )
-    meta_df.to_sql("metadata", out_conn, if_exists="replace", index=False)
 
-    # preview 저장
-    out_df.head(50).to_sql("events_preview", out_conn, if_exists="replace", index=False)
+    # preview: 데이터 복사 없이 VIEW 로 제공 (항상 events 와 일치)
+    cur.execute("CREATE VIEW events_preview AS SELECT * FROM events LIMIT 50;")
 
     # 인덱스 생성
     cur.execute(
@@ -171,8 +243,10 @@ def convert_and_write(src_db: Path, out_db: Path):
     cur.execute("CREATE INDEX IF NOT EXISTS idx_events_stream ON events(stream);")
     out_conn.commit()
 
+    cur.execute("DETACH DATABASE src")
+    cur.execute("PRAGMA optimize")
     out_conn.close()
-    src_conn.close()
+    return True
 
 
 def main():
@@ -190,8 +264,8 @@ def main():
         raise SystemExit(f"입력 DB가 존재하지 않습니다: {src}")
 
     out.parent.mkdir(parents=True, exist_ok=True)
-    convert_and_write(src, out)
-    print(f"[OK] 변환 완료 -> {out}")
+    if convert_and_write(src, out):
+        print(f"[OK] 변환 완료 -> {out}")
 
 
 if __name__ == "__main__":